@@ -5,33 +5,89 @@ data relationship analysis
 
 import json
 import os
+import queue
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
 from decimal import Decimal
-from typing import Dict, List, Any
+from typing import Dict, Iterator, List, Any, Tuple
 import pymysql
-from pymysql.cursors import DictCursor
+from pymysql.constants import CLIENT
+from pymysql.cursors import DictCursor, SSCursor, SSDictCursor
 
+try:
+    import orjson
+except ImportError:  # optional, fall back to the stdlib json encoder
+    orjson = None
 
-class DecimalEncoder(json.JSONEncoder):
-    """custom json encoder"""
-    def default(self, obj):
-        if isinstance(obj, Decimal):
-            return float(obj)
-        return super(DecimalEncoder, self).default(obj)
+
+def _coerce(value):
+    """recursively convert Decimal values returned by pymysql into int / float so the results are plain JSON types"""
+    if isinstance(value, Decimal):
+        # SUM() over integer counts comes back as an integral Decimal, keep it a count
+        return int(value) if value == value.to_integral_value() else float(value)
+    if isinstance(value, dict):
+        return {k: _coerce(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_coerce(v) for v in value]
+    return value
 
 
 class DataRelationshipAnalyzer:
     """data relationship analyzer"""
     
+    # analyze steps, keyed by the name recorded in metadata.completed_steps
+    STEPS = {
+        'account_person': 'analyze_account_person_relationship',
+        'account_activity': 'analyze_account_activity_relationship',
+        'person_activity': 'analyze_person_activity_relationship',
+        'account_list_member': 'analyze_account_list_patterns',
+        'temporal': 'analyze_temporal_patterns'
+    }
+    
+    # steps that read the recent activity slice, they share one connection so they see the same session temp table
+    RECENT_ACTIVITY_STEPS = ('account_activity', 'person_activity', 'temporal')
+    
+    # fields computed with APPROX_COUNT_DISTINCT unless exact_counts is set
+    APPROXIMATE_FIELDS = [
+        'relationships.account_person.unique_accounts',
+        'relationships.account_person.unique_persons',
+        'relationships.account_person.accounts_with_persons',
+        'relationships.account_person.accounts_without_persons',
+        'relationships.account_activity.unique_accounts',
+        'relationships.account_activity.accounts_with_activities',
+        'relationships.account_activity.accounts_without_activities',
+        'relationships.person_activity.unique_persons',
+        'relationships.person_activity.persons_with_activities',
+        'relationships.person_activity.persons_without_activities',
+        'data_flow_patterns.temporal.activity_monthly.unique_accounts',
+        'data_flow_patterns.temporal.activity_monthly.unique_persons'
+    ]
+    
     def __init__(self, config: Dict[str, Any]):
         """
         initialize data relationship analyzer
         :param config: database connection configuration
         """
         self.config = config
-        self.connection = None
+        self.pool = None
+        self.pool_size = config.get('pool_size', 5)
+        self.create_indexes = config.get('create_indexes', False)  # needs write privileges, off for read-only users
+        self.exact_counts = config.get('exact_counts', False)  # COUNT(DISTINCT) instead of APPROX_COUNT_DISTINCT
+        self._results_lock = threading.Lock()
+        self.output_path = None
+        self._cached_counts = {}
         self.results = {
             'metadata': {
-                'database': config.get('database', 'unknown')
+                'database': config.get('database', 'unknown'),
+                'activity_time_range_days': config.get('activity_time_range_days', 90),
+                'exact_counts': self.exact_counts,
+                'approximate_fields': [] if self.exact_counts else self.APPROXIMATE_FIELDS,
+                # the *_count_buckets are exact in either mode
+                'bucket_population': 'the count buckets partition the base table rows: non-zero buckets only count keys present in the base table, '
+                                     'the "0" bucket is the base table row count minus them, percentages are of that row count',
+                'completed_steps': []
             },
             'relationships': {},
             'data_flow_patterns': {}
@@ -41,226 +97,412 @@ class DataRelationshipAnalyzer:
         self.activity_time_range_days = config.get('activity_time_range_days', 90)  # default 90 days
     
     def connect(self):
-        """connect to MySQL database"""
+        """open a pool of MySQL connections, one per concurrent analyzer"""
         try:
-            self.connection = pymysql.connect(
-                host=self.config['host'],
-                port=self.config.get('port', 3306),
-                user=self.config['user'],
-                password=self.config['password'],
-                database=self.config['database'],
-                cursorclass=DictCursor
-            )
-            print(f"✓ connect to database: {self.config['database']}")
+            self.pool = queue.Queue()
+            for _ in range(self.pool_size):
+                self.pool.put(pymysql.connect(
+                    host=self.config['host'],
+                    port=self.config.get('port', 3306),
+                    user=self.config['user'],
+                    password=self.config['password'],
+                    database=self.config['database'],
+                    client_flag=CLIENT.MULTI_STATEMENTS
+                ))
+            print(f"✓ connect to database: {self.config['database']} ({self.pool_size} connections)")
         except Exception as e:
             print(f"✗ connect to database failed: {e}")
+            self.close()
             raise
+        
+        if self.create_indexes:
+            self.ensure_indexes()
+    
+    def ensure_indexes(self, sql_file: str = 'migrations/ensure_indexes.sql'):
+        """create the indexes the analyzer queries rely on, skipping the ones that already exist and reporting the ones that fail"""
+        sql_path = os.path.join(os.path.dirname(__file__), sql_file)
+        with open(sql_path, 'r', encoding='utf-8') as f:
+            sql = '\n'.join(line for line in f if not line.lstrip().startswith('--'))
+        
+        statements = [statement.strip() for statement in sql.split(';') if statement.strip()]
+        created, existing, failed = 0, 0, 0
+        with self.get_connection() as connection:
+            # stock MySQL has no CREATE INDEX IF NOT EXISTS, look the index names up instead
+            existing_indexes = {
+                (row['table_name'], row['index_name'])
+                for row in self.execute_query(connection, """
+                    SELECT DISTINCT TABLE_NAME as table_name, INDEX_NAME as index_name
+                    FROM information_schema.STATISTICS
+                    WHERE TABLE_SCHEMA = DATABASE()
+                """)
+            }
+            for statement in statements:
+                match = re.match(r'CREATE\s+INDEX\s+(\w+)\s+ON\s+(\w+)', statement, re.IGNORECASE)
+                if match and (match.group(2), match.group(1)) in existing_indexes:
+                    existing += 1
+                    continue
+                try:
+                    with connection.cursor() as cursor:
+                        cursor.execute(statement)
+                    created += 1
+                except Exception as e:
+                    # e.g. Doris only accepts single column indexes with USING ...
+                    failed += 1
+                    print(f"✗ create index failed: {e}")
+                    print(f"SQL: {statement}")
+        if failed:
+            print(f"⚠️  created {created} indexes, {existing} already existed, {failed} failed from {sql_file}")
+        else:
+            print(f"✓ created {created} indexes, {existing} already existed from {sql_file}")
     
     def close(self):
-        """close database connection"""
-        if self.connection:
-            self.connection.close()
+        """close all pooled database connections"""
+        if self.pool:
+            while not self.pool.empty():
+                self.pool.get_nowait().close()
     
-    def execute_query(self, query: str) -> List[Dict]:
-        """execute SQL query and return result"""
+    @contextmanager
+    def get_connection(self):
+        """borrow a connection from the pool and give it back when done"""
+        connection = self.pool.get()
         try:
-            with self.connection.cursor() as cursor:
-                cursor.execute(query)
+            yield connection
+        finally:
+            self.pool.put(connection)
+    
+    def execute_query(self, connection, query: str, args: Tuple = None) -> List[Dict]:
+        """execute SQL query on the given connection and return result, for single-row aggregates"""
+        try:
+            with connection.cursor(DictCursor) as cursor:
+                cursor.execute(query, args)
                 return cursor.fetchall()
         except Exception as e:
             print(f"✗ execute query failed: {e}")
             return []
     
-    def analyze_account_person_relationship(self):
+    def execute_many_queries(self, connection, queries: List[str], args: Tuple = None) -> List[List[Dict]]:
+        """send several SELECT statements in one round trip and return one row list per statement, args are bound in statement order"""
+        batch = ';\n'.join(query.strip().rstrip(';') for query in queries)
+        result_sets = []
+        try:
+            with connection.cursor(DictCursor) as cursor:
+                cursor.execute(batch, args)
+                result_sets.append(cursor.fetchall())
+                while cursor.nextset():
+                    result_sets.append(cursor.fetchall())
+        except Exception as e:
+            print(f"✗ execute query failed: {e}")
+        # pad so callers can always unpack one list per statement
+        return result_sets + [[] for _ in range(len(queries) - len(result_sets))]
+    
+    def execute_query_stream(self, connection, query: str, args: Tuple = None, cursor_class=SSDictCursor) -> Iterator[Dict]:
+        """execute SQL query with an unbuffered server-side cursor and yield rows one by one"""
+        try:
+            with connection.cursor(cursor_class) as cursor:
+                cursor.execute(query, args)
+                yield from cursor
+        except Exception as e:
+            print(f"✗ execute query failed: {e}")
+    
+    def execute_query_tuples(self, connection, query: str, args: Tuple = None) -> Iterator[Tuple]:
+        """stream rows as plain tuples (in SELECT order), avoids building a dict per row when the caller reshapes them anyway"""
+        return self.execute_query_stream(connection, query, args, SSCursor)
+    
+    def _run_with_connection(self, step):
+        """run an analyze step on a connection borrowed from the pool"""
+        with self.get_connection() as connection:
+            step(connection)
+    
+    def _run_recent_activity_steps(self, steps):
+        """
+        materialize the recent activity slice once, then run the activity steps against it on the same connection,
+        they run in sequence so the activity table is scanned once instead of once per step
+        """
+        with self.get_connection() as connection:
+            try:
+                self._create_temp_table(connection, 'tmp_recent_activity', """
+                    SELECT id, account_id, person_id, activityType, activity_date
+                    FROM activity
+                    WHERE activity_date >= DATE_SUB(NOW(), INTERVAL %s DAY)
+                """, (self.activity_time_range_days,))
+            except Exception as e:
+                # none of the steps can run without the slice, fail all of them so a rerun resumes them
+                raise RuntimeError(f"create tmp_recent_activity failed, {', '.join(step.__name__ for step in steps)} not run: {e}") from e
+            failed = []
+            try:
+                for step in steps:
+                    # one failing step does not keep the others from using the slice
+                    try:
+                        step(connection)
+                    except Exception as e:
+                        print(f"✗ {step.__name__} failed: {e}")
+                        failed.append(step.__name__)
+            finally:
+                self._drop_temp_table(connection, 'tmp_recent_activity')
+            if failed:
+                raise RuntimeError(f"{', '.join(failed)} failed")
+    
+    def _prime_counts(self):
+        """count account_base / person_norm once per run, the analyzers reuse these instead of re-scanning"""
+        query = f"""
+        SELECT
+            (SELECT {self._count_distinct('id')} FROM account_base) AS account_base,
+            (SELECT {self._count_distinct('id')} FROM person_norm) AS person_norm,
+            (SELECT COUNT(*) FROM account_base) AS account_base_rows,
+            (SELECT COUNT(*) FROM person_norm) AS person_norm_rows
+        """
+        with self.get_connection() as connection:
+            result = self.execute_query(connection, query)
+        if not result:
+            # every step divides by these totals, do not store stats computed against zeros
+            raise RuntimeError("count account_base / person_norm failed")
+        data = result[0]
+        self._cached_counts = {
+            'account_base': data.get('account_base') or 0,
+            'person_norm': data.get('person_norm') or 0,
+            'account_base_rows': data.get('account_base_rows') or 0,
+            'person_norm_rows': data.get('person_norm_rows') or 0
+        }
+        print(f"✓ account_base: {self._cached_counts['account_base_rows']} rows, person_norm: ~{self._cached_counts['person_norm']} persons")
+    
+    def _count_distinct(self, expression: str) -> str:
+        """distinct count SQL for the expression, approximate (HLL) unless exact counts are requested"""
+        if self.exact_counts:
+            return f"COUNT(DISTINCT {expression})"
+        return f"APPROX_COUNT_DISTINCT({expression})"
+    
+    def _create_temp_table(self, connection, table_name: str, select_query: str, args: Tuple = None):
+        """
+        materialize an aggregate into a session temporary table so that follow-up queries scan it instead of the base table,
+        raises when it cannot be created (e.g. Doris / StarRocks have no session temporary tables) so the step fails instead of storing empty results
+        """
+        self._drop_temp_table(connection, table_name)
+        with connection.cursor() as cursor:
+            cursor.execute(f"CREATE TEMPORARY TABLE `{table_name}` AS {select_query}", args)
+    
+    def _drop_temp_table(self, connection, table_name: str):
+        """drop a session temporary table"""
+        self.execute_query(connection, f"DROP TEMPORARY TABLE IF EXISTS `{table_name}`")
+    
+    def _zero_bucket(self, count_key: str, buckets: List[Dict], total: int) -> Dict:
+        """build the "0" bucket as the base table rows not in any non-zero bucket, so the buckets partition the base table"""
+        zero_count = max(total - sum(bucket[count_key] for bucket in buckets), 0)
+        return {
+            'range': '0',
+            count_key: zero_count,
+            'percentage': round(zero_count * 100 / total, 2) if total else 0
+        }
+    
+    def analyze_account_person_relationship(self, connection):
         """analyze account_base and person_norm relationship"""
         print("\nanalyze account_base <-> person_norm relationship...")
         
+        # scan person_norm once, the stats / distribution / bucket queries all read the per-account counts
+        self._create_temp_table(connection, 'tmp_account_person_counts', """
+            SELECT
+                account_id,
+                COUNT(*) AS person_count
+            FROM person_norm
+            GROUP BY account_id
+        """)
+        
         # 1. basic relationship statistics
-        query = """
-            WITH AccountPersonCounts AS (
-                SELECT
-                    account_id,
-                    COUNT(*) AS person_count
-                FROM person_norm
-                GROUP BY account_id
-            ),
-            PersonStats AS (
-                SELECT
-                    AVG(person_count) AS avg_persons_per_account,
-                    MIN(person_count) AS min_persons_per_account,
-                    MAX(person_count) AS max_persons_per_account,
-                    STDDEV(person_count) AS std_persons_per_account
-                FROM AccountPersonCounts
-            ),
-            OverallStats AS (
-                SELECT
-                    (SELECT APPROX_COUNT_DISTINCT(id) FROM account_base) AS unique_accounts,
-                    (SELECT APPROX_COUNT_DISTINCT(id) FROM person_norm) AS unique_persons,
-                    APPROX_COUNT_DISTINCT(ab.id) AS unique_accounts_with_persons
-                FROM account_base ab
-                INNER JOIN AccountPersonCounts apc ON ab.id = apc.account_id
-            )
+        # one scan of the temporary table, MySQL cannot reopen a temporary table within a single statement,
+        # the LEFT JOIN keeps every per-account count for the aggregates and only matches existing accounts for the distinct count
+        query = f"""
             SELECT
-                o.unique_accounts,
-                o.unique_persons,
-                o.unique_accounts_with_persons,
-                p.avg_persons_per_account,
-                p.min_persons_per_account,
-                p.max_persons_per_account,
-                p.std_persons_per_account
-            FROM OverallStats o
-            CROSS JOIN PersonStats p;
+                %s AS unique_accounts,
+                {self._count_distinct('ab.id')} AS unique_accounts_with_persons,
+                COALESCE(CAST(ROUND(AVG(apc.person_count), 2) AS DOUBLE), 0) AS avg_persons_per_account,
+                MIN(apc.person_count) AS min_persons_per_account,
+                MAX(apc.person_count) AS max_persons_per_account,
+                COALESCE(CAST(ROUND(STDDEV(apc.person_count), 2) AS DOUBLE), 0) AS std_persons_per_account
+            FROM tmp_account_person_counts apc
+            LEFT JOIN account_base ab ON ab.id = apc.account_id;
+        """
+        
+        # 2. number of persons distribution pattern，
+        # count the number of persons distribution, the number of accounts with the same number of persons and the percentage
+        dist_query = """
+        SELECT 
+            person_count,
+            COUNT(*) as account_count,
+            CAST(ROUND(COUNT(*) * 100.0 / SUM(COUNT(*)) OVER (), 2) AS DOUBLE) as percentage
+        FROM tmp_account_person_counts
+        GROUP BY person_count
+        ORDER BY person_count
+        LIMIT 100
         """
-        result = self.execute_query(query)
+        
+        # 3. bucket statistics
+        # count the number of persons distribution, the number of accounts with the same number of persons and the percentage
+        # only accounts that exist in account_base are bucketed, the "0" bucket is the rest of its rows
+        bucket_query = """
+        WITH 
+            ranged_counts AS (
+                SELECT 
+                    CASE 
+                        WHEN person_count <= 5 THEN 2
+                        WHEN person_count <= 10 THEN 3
+                        WHEN person_count <= 20 THEN 4
+                        WHEN person_count <= 50 THEN 5
+                        WHEN person_count <= 100 THEN 6
+                        WHEN person_count <= 500 THEN 7
+                        ELSE 8
+                    END as range_id,
+                    CASE 
+                        WHEN person_count <= 5 THEN '1-5'
+                        WHEN person_count <= 10 THEN '6-10'
+                        WHEN person_count <= 20 THEN '11-20'
+                        WHEN person_count <= 50 THEN '21-50'
+                        WHEN person_count <= 100 THEN '51-100'
+                        WHEN person_count <= 500 THEN '101-500'
+                        ELSE '500+'
+                    END as person_range
+                FROM tmp_account_person_counts apc
+                INNER JOIN account_base ab ON ab.id = apc.account_id
+            )
+            SELECT 
+                person_range,
+                COUNT(*) as account_count,
+                CAST(ROUND(COUNT(*) * 100.0 / NULLIF(%s, 0), 2) AS DOUBLE) as percentage
+            FROM ranged_counts
+            GROUP BY range_id, person_range
+            ORDER BY range_id;
+        """
+        
+        result, distribution, buckets = self.execute_many_queries(
+            connection, [query, dist_query, bucket_query],
+            (self._cached_counts['account_base'], self._cached_counts['account_base_rows'])
+        )
         
         if result:
             data = result[0]
             relationship = {
                 'unique_accounts': data['unique_accounts'],
-                'unique_persons': data['unique_persons'],
+                'unique_persons': self._cached_counts['person_norm'],  # same cached total as person_activity
                 'accounts_with_persons': data['unique_accounts_with_persons'],
-                'accounts_without_persons': data['unique_accounts'] - data['unique_accounts_with_persons'],
-                'avg_persons_per_account': round(float(data['avg_persons_per_account']), 2) if data['avg_persons_per_account'] else 0,
+                'accounts_without_persons': max(data['unique_accounts'] - data['unique_accounts_with_persons'], 0),
+                'avg_persons_per_account': data['avg_persons_per_account'],
                 'min_persons_per_account': data['min_persons_per_account'],
                 'max_persons_per_account': data['max_persons_per_account'],
-                'std_persons_per_account': round(float(data['std_persons_per_account']), 2) if data['std_persons_per_account'] else 0
+                'std_persons_per_account': data['std_persons_per_account']
             }
             
-            # 2. number of persons distribution pattern，
-            # count the number of persons distribution, the number of accounts with the same number of persons and the percentage
-            dist_query = """
-            SELECT 
-                person_count,
-                COUNT(*) as account_count,
-                COUNT(*) * 100.0 / (SELECT APPROX_COUNT_DISTINCT(account_id) FROM person_norm) as percentage
-            FROM (
-                SELECT account_id, COUNT(*) as person_count
-                FROM person_norm
-                GROUP BY account_id
-            ) person_dist
-            GROUP BY person_count
-            ORDER BY person_count
-            LIMIT 100
-            """
-            distribution = self.execute_query(dist_query)
             relationship['person_count_distribution'] = [
                 {
                     'person_count': d['person_count'],
                     'account_count': d['account_count'],
-                    'percentage': round(d['percentage'], 2)
+                    'percentage': d['percentage']
                 }
                 for d in distribution
             ]
             
-            # 3. bucket statistics
-            # count the number of persons distribution, the number of accounts with the same number of persons and the percentage
-            bucket_query = """
-            WITH 
-                total_accounts AS (
-                    SELECT COUNT(*) as total_cnt FROM account_base
-                ),
-                person_counts AS (
-                    SELECT 
-                        ab.id,
-                        COUNT(pn.id) as person_count
-                    FROM account_base ab
-                    LEFT JOIN person_norm pn ON ab.id = pn.account_id
-                    GROUP BY ab.id
-                ),
-                ranged_counts AS (
-                    SELECT 
-                        CASE 
-                            WHEN person_count = 0 THEN 1
-                            WHEN person_count <= 5 THEN 2
-                            WHEN person_count <= 10 THEN 3
-                            WHEN person_count <= 20 THEN 4
-                            WHEN person_count <= 50 THEN 5
-                            WHEN person_count <= 100 THEN 6
-                            WHEN person_count <= 500 THEN 7
-                            ELSE 8
-                        END as range_id,
-                        CASE 
-                            WHEN person_count = 0 THEN '0'
-                            WHEN person_count <= 5 THEN '1-5'
-                            WHEN person_count <= 10 THEN '6-10'
-                            WHEN person_count <= 20 THEN '11-20'
-                            WHEN person_count <= 50 THEN '21-50'
-                            WHEN person_count <= 100 THEN '51-100'
-                            WHEN person_count <= 500 THEN '101-500'
-                            ELSE '500+'
-                        END as person_range
-                    FROM person_counts
-                )
-                SELECT 
-                    person_range,
-                    COUNT(*) as account_count,
-                    ROUND(COUNT(*) * 100.0 / (SELECT total_cnt FROM total_accounts), 2) as percentage
-                FROM ranged_counts
-                GROUP BY range_id, person_range
-                ORDER BY range_id;
-            """
-            buckets = self.execute_query(bucket_query)
             relationship['person_count_buckets'] = [
+                self._zero_bucket('account_count', buckets, self._cached_counts['account_base_rows'])
+            ] + [
                 {
                     'range': b['person_range'],
                     'account_count': b['account_count'],
-                    'percentage': round(b['percentage'], 2)
+                    'percentage': b['percentage']
                 }
                 for b in buckets
             ]
             
-            self.results['relationships']['account_person'] = relationship
+            self._store_result('relationships', 'account_person', relationship)
             print(f"  ✓ found {relationship['unique_accounts']} accounts, {relationship['unique_persons']} persons")
+        
+        self._drop_temp_table(connection, 'tmp_account_person_counts')
     
-    def analyze_account_activity_relationship(self):
+    def analyze_account_activity_relationship(self, connection):
         """analyze account_base and activity relationship"""
         print(f"\nanalyze account_base <-> activity relationship (last {self.activity_time_range_days} days)...")
         
-        # 1. basic relationship statistics (optimized with time range)
-        query = f"""
-        WITH RecentActivities AS (
-            SELECT
-                id,
-                account_id
-            FROM activity
-            WHERE activity_date >= DATE_SUB(NOW(), INTERVAL {self.activity_time_range_days} DAY)
-        ),
-        AccountActivityCounts AS (
+        # aggregate the recent activity slice once, the stats and bucket queries read the per-account counts
+        self._create_temp_table(connection, 'tmp_recent_activity_counts', """
             SELECT
                 account_id,
                 COUNT(*) AS activity_count
-            FROM RecentActivities
+            FROM tmp_recent_activity
             GROUP BY account_id
-        ),
-        ActivityStats AS (
-            SELECT
-                AVG(activity_count) AS avg_activities_per_account,
-                MIN(activity_count) AS min_activities_per_account,
-                MAX(activity_count) AS max_activities_per_account,
-                STDDEV(activity_count) AS std_activities_per_account
-            FROM AccountActivityCounts
-        ),
-        OverallStats AS (
-            SELECT
-                (SELECT APPROX_COUNT_DISTINCT(id) FROM account_base) AS unique_accounts,
-                (SELECT APPROX_COUNT_DISTINCT(id) FROM RecentActivities) AS unique_activities,
-                APPROX_COUNT_DISTINCT(ab.id) AS unique_accounts_with_activities
-            FROM account_base ab
-            INNER JOIN AccountActivityCounts aac ON ab.id = aac.account_id
-        )
+        """)
+        
+        # 1. basic relationship statistics (optimized with time range)
+        # one scan of the temporary table, MySQL cannot reopen a temporary table within a single statement,
+        # the LEFT JOIN keeps every per-account count for the aggregates and only matches existing accounts for the distinct count
+        query = f"""
         SELECT
-            o.unique_accounts,
-            o.unique_activities,
-            o.unique_accounts_with_activities,
-            s.avg_activities_per_account,
-            s.min_activities_per_account,
-            s.max_activities_per_account,
-            s.std_activities_per_account
-        FROM OverallStats o
-        CROSS JOIN ActivityStats s;
+            %s AS unique_accounts,
+            SUM(aac.activity_count) AS unique_activities,
+            {self._count_distinct('ab.id')} AS unique_accounts_with_activities,
+            COALESCE(CAST(ROUND(AVG(aac.activity_count), 2) AS DOUBLE), 0) AS avg_activities_per_account,
+            MIN(aac.activity_count) AS min_activities_per_account,
+            MAX(aac.activity_count) AS max_activities_per_account,
+            COALESCE(CAST(ROUND(STDDEV(aac.activity_count), 2) AS DOUBLE), 0) AS std_activities_per_account
+        FROM tmp_recent_activity_counts aac
+        LEFT JOIN account_base ab ON ab.id = aac.account_id;
         """        
         
-        result = self.execute_query(query)
+        # 2. activity count distribution (bucket statistics with time range optimization)
+        # count the number of activities distribution, the number of accounts with the same number of activities and the percentage
+        # only accounts that exist in account_base are bucketed, the "0" bucket is the rest of its rows
+        bucket_query = """
+        WITH activity_ranges AS (
+            SELECT 
+                CASE 
+                    WHEN activity_count <= 10 THEN 2
+                    WHEN activity_count <= 50 THEN 3
+                    WHEN activity_count <= 100 THEN 4
+                    WHEN activity_count <= 500 THEN 5
+                    WHEN activity_count <= 1000 THEN 6
+                    WHEN activity_count <= 5000 THEN 7
+                    ELSE 8
+                END as range_id,
+                CASE 
+                    WHEN activity_count <= 10 THEN '1-10'
+                    WHEN activity_count <= 50 THEN '11-50'
+                    WHEN activity_count <= 100 THEN '51-100'
+                    WHEN activity_count <= 500 THEN '101-500'
+                    WHEN activity_count <= 1000 THEN '501-1000'
+                    WHEN activity_count <= 5000 THEN '1001-5000'
+                    ELSE '5000+'
+                END as activity_range
+            FROM tmp_recent_activity_counts aac
+            INNER JOIN account_base ab ON ab.id = aac.account_id
+        )
+        SELECT 
+            activity_range,
+            COUNT(*) as account_count,
+            CAST(ROUND(COUNT(*) * 100.0 / NULLIF(%s, 0), 2) AS DOUBLE) as percentage
+        FROM activity_ranges
+        GROUP BY range_id, activity_range
+        ORDER BY range_id;
+        """
+        
+        # 3. activity type distribution (with time range optimization)
+        type_query = """
+        SELECT
+            activityType,
+            activity_count AS count,
+            -- use window function to calculate total and percentage
+            CAST(ROUND(activity_count * 100.0 / SUM(activity_count) OVER (), 2) AS DOUBLE) AS percentage
+        FROM (
+            -- 1. filter data and calculate the number of each activityType
+            SELECT
+                activityType,
+                COUNT(*) as activity_count
+            FROM tmp_recent_activity
+            WHERE activityType IS NOT NULL
+            GROUP BY activityType
+        ) AS grouped_data
+        ORDER BY count DESC
+        LIMIT 20;
+        """
+        
+        result, buckets, activity_types = self.execute_many_queries(
+            connection, [query, bucket_query, type_query],
+            (self._cached_counts['account_base'], self._cached_counts['account_base_rows'])
+        )
         
         if result:
             data = result[0]
@@ -268,96 +510,29 @@ class DataRelationshipAnalyzer:
                 'unique_accounts': data['unique_accounts'],
                 'unique_activities': data['unique_activities'],
                 'accounts_with_activities': data['unique_accounts_with_activities'],
-                'accounts_without_activities': data['unique_accounts'] - data['unique_accounts_with_activities'],
-                'avg_activities_per_account': round(float(data['avg_activities_per_account']), 2) if data['avg_activities_per_account'] else 0,
+                'accounts_without_activities': max(data['unique_accounts'] - data['unique_accounts_with_activities'], 0),
+                'avg_activities_per_account': data['avg_activities_per_account'],
                 'min_activities_per_account': data['min_activities_per_account'],
                 'max_activities_per_account': data['max_activities_per_account'],
-                'std_activities_per_account': round(float(data['std_activities_per_account']), 2) if data['std_activities_per_account'] else 0
+                'std_activities_per_account': data['std_activities_per_account']
             }
             
-            # 2. activity count distribution (bucket statistics with time range optimization)
-            # count the number of activities distribution, the number of accounts with the same number of activities and the percentage
-            bucket_query = f"""
-            WITH total_accounts AS (
-                SELECT COUNT(*) as total_cnt FROM account_base
-            ),
-            account_activities AS (
-                SELECT 
-                    ab.id,
-                    COUNT(a.id) as activity_count
-                FROM account_base ab
-                LEFT JOIN activity a ON ab.id = a.account_id 
-                    AND a.activity_date >= DATE_SUB(NOW(), INTERVAL {self.activity_time_range_days} DAY)
-                GROUP BY ab.id
-            ),
-            activity_ranges AS (
-                SELECT 
-                    CASE 
-                        WHEN activity_count = 0 THEN 1
-                        WHEN activity_count <= 10 THEN 2
-                        WHEN activity_count <= 50 THEN 3
-                        WHEN activity_count <= 100 THEN 4
-                        WHEN activity_count <= 500 THEN 5
-                        WHEN activity_count <= 1000 THEN 6
-                        WHEN activity_count <= 5000 THEN 7
-                        ELSE 8
-                    END as range_id,
-                    CASE 
-                        WHEN activity_count = 0 THEN '0'
-                        WHEN activity_count <= 10 THEN '1-10'
-                        WHEN activity_count <= 50 THEN '11-50'
-                        WHEN activity_count <= 100 THEN '51-100'
-                        WHEN activity_count <= 500 THEN '101-500'
-                        WHEN activity_count <= 1000 THEN '501-1000'
-                        WHEN activity_count <= 5000 THEN '1001-5000'
-                        ELSE '5000+'
-                    END as activity_range
-                FROM account_activities
-            )
-            SELECT 
-                activity_range,
-                COUNT(*) as account_count,
-                ROUND(COUNT(*) * 100.0 / (SELECT total_cnt FROM total_accounts), 2) as percentage
-            FROM activity_ranges
-            GROUP BY range_id, activity_range
-            ORDER BY range_id;
-            """
-            buckets = self.execute_query(bucket_query)
             relationship['activity_count_buckets'] = [
+                self._zero_bucket('account_count', buckets, self._cached_counts['account_base_rows'])
+            ] + [
                 {
                     'range': b['activity_range'],
                     'account_count': b['account_count'],
-                    'percentage': round(b['percentage'], 2)
+                    'percentage': b['percentage']
                 }
                 for b in buckets
             ]
             
-            # 3. activity type distribution (with time range optimization)
-            type_query = f"""
-            SELECT
-                activityType,
-                activity_count AS count,
-                -- use window function to calculate total and percentage
-                (activity_count * 100.0 / SUM(activity_count) OVER ()) AS percentage
-            FROM (
-                -- 1. filter data and calculate the number of each activityType
-                SELECT
-                    activityType,
-                    COUNT(*) as activity_count
-                FROM activity
-                WHERE activityType IS NOT NULL
-                AND activity_date >= DATE_SUB(NOW(), INTERVAL {self.activity_time_range_days} DAY)
-                GROUP BY activityType
-            ) AS grouped_data
-            ORDER BY count DESC
-            LIMIT 20;
-            """
-            activity_types = self.execute_query(type_query)
             relationship['activity_type_distribution'] = [
                 {
                     'type_category': 'type_' + str(i),  # do not expose actual type names
                     'count': at['count'],
-                    'percentage': round(at['percentage'], 2)
+                    'percentage': at['percentage']
                 }
                 for i, at in enumerate(activity_types)
             ]
@@ -368,10 +543,12 @@ class DataRelationshipAnalyzer:
                 'note': f'Analysis based on last {self.activity_time_range_days} days of activity data'
             }
             
-            self.results['relationships']['account_activity'] = relationship
+            self._store_result('relationships', 'account_activity', relationship)
             print(f"  ✓ found {relationship['unique_accounts']} accounts, {relationship['unique_activities']} activities")
+        
+        self._drop_temp_table(connection, 'tmp_recent_activity_counts')
     
-    def analyze_person_activity_relationship(self):
+    def analyze_person_activity_relationship(self, connection):
         """analyze person_norm and activity relationship"""
         print(f"\nanalyze person_norm <-> activity relationship (last {self.activity_time_range_days} days)...")
         
@@ -381,24 +558,58 @@ class DataRelationshipAnalyzer:
             SELECT 
                 person_id, 
                 COUNT(*) as activity_count
-            FROM activity 
-            WHERE activity_date >= DATE_SUB(NOW(), INTERVAL {self.activity_time_range_days} DAY)
+            FROM tmp_recent_activity
             GROUP BY person_id
         )
         SELECT 
-            APPROX_COUNT_DISTINCT(pn.id) as unique_persons,
-            APPROX_COUNT_DISTINCT(a.id) as unique_activities,
-            APPROX_COUNT_DISTINCT(CASE WHEN ac.activity_count > 0 THEN pn.id END) as unique_persons_with_activities,
-            AVG(COALESCE(ac.activity_count, 0)) as avg_activities_per_person,
+            %s as unique_persons,
+            COALESCE(SUM(ac.activity_count), 0) as unique_activities,
+            {self._count_distinct('CASE WHEN ac.activity_count > 0 THEN pn.id END')} as unique_persons_with_activities,
+            COALESCE(CAST(ROUND(AVG(COALESCE(ac.activity_count, 0)), 2) AS DOUBLE), 0) as avg_activities_per_person,
             MIN(COALESCE(ac.activity_count, 0)) as min_activities_per_person,
             MAX(COALESCE(ac.activity_count, 0)) as max_activities_per_person,
-            STDDEV(COALESCE(ac.activity_count, 0)) as std_activities_per_person
+            COALESCE(CAST(ROUND(STDDEV(COALESCE(ac.activity_count, 0)), 2) AS DOUBLE), 0) as std_activities_per_person
         FROM person_norm pn
         LEFT JOIN activity_counts ac ON pn.id = ac.person_id
-        LEFT JOIN activity a ON pn.id = a.person_id 
-            AND a.activity_date >= DATE_SUB(NOW(), INTERVAL {self.activity_time_range_days} DAY)
         """
-        result = self.execute_query(query)
+        
+        # 2. activity count distribution (bucket statistics with time range optimization)
+        # only persons that exist in person_norm are bucketed, the "0" bucket is the rest of its rows
+        bucket_query = """
+        SELECT 
+            CASE 
+                WHEN activity_count BETWEEN 1 AND 10 THEN '1-10'
+                WHEN activity_count BETWEEN 11 AND 50 THEN '11-50'
+                WHEN activity_count BETWEEN 51 AND 100 THEN '51-100'
+                WHEN activity_count BETWEEN 101 AND 500 THEN '101-500'
+                WHEN activity_count BETWEEN 501 AND 1000 THEN '501-1000'
+                ELSE '1000+'
+            END as activity_range,
+            COUNT(*) as person_count,
+            CAST(ROUND(COUNT(*) * 100.0 / NULLIF(%s, 0), 2) AS DOUBLE) as percentage
+        FROM (
+            SELECT person_id, COUNT(*) as activity_count
+            FROM tmp_recent_activity
+            WHERE person_id IS NOT NULL
+            GROUP BY person_id
+        ) activity_dist
+        INNER JOIN person_norm pn ON pn.id = activity_dist.person_id
+        GROUP BY activity_range
+        ORDER BY 
+            CASE activity_range
+                WHEN '1-10' THEN 2
+                WHEN '11-50' THEN 3
+                WHEN '51-100' THEN 4
+                WHEN '101-500' THEN 5
+                WHEN '501-1000' THEN 6
+                ELSE 7
+            END
+        """
+        
+        result, buckets = self.execute_many_queries(
+            connection, [query, bucket_query],
+            (self._cached_counts['person_norm'], self._cached_counts['person_norm_rows'])
+        )
         
         if result:
             data = result[0]
@@ -406,52 +617,20 @@ class DataRelationshipAnalyzer:
                 'unique_persons': data['unique_persons'],
                 'unique_activities': data['unique_activities'],
                 'persons_with_activities': data['unique_persons_with_activities'],
-                'persons_without_activities': data['unique_persons'] - data['unique_persons_with_activities'],
-                'avg_activities_per_person': round(float(data['avg_activities_per_person']), 2) if data['avg_activities_per_person'] else 0,
+                'persons_without_activities': max(data['unique_persons'] - data['unique_persons_with_activities'], 0),
+                'avg_activities_per_person': data['avg_activities_per_person'],
                 'min_activities_per_person': data['min_activities_per_person'],
                 'max_activities_per_person': data['max_activities_per_person'],
-                'std_activities_per_person': round(float(data['std_activities_per_person']), 2) if data['std_activities_per_person'] else 0
+                'std_activities_per_person': data['std_activities_per_person']
             }
             
-            # 2. activity count distribution (bucket statistics with time range optimization)
-            bucket_query = f"""
-            SELECT 
-                CASE 
-                    WHEN activity_count = 0 THEN '0'
-                    WHEN activity_count BETWEEN 1 AND 10 THEN '1-10'
-                    WHEN activity_count BETWEEN 11 AND 50 THEN '11-50'
-                    WHEN activity_count BETWEEN 51 AND 100 THEN '51-100'
-                    WHEN activity_count BETWEEN 101 AND 500 THEN '101-500'
-                    WHEN activity_count BETWEEN 501 AND 1000 THEN '501-1000'
-                    ELSE '1000+'
-                END as activity_range,
-                COUNT(*) as person_count,
-                COUNT(*) * 100.0 / (SELECT APPROX_COUNT_DISTINCT(id) FROM person_norm) as percentage
-            FROM (
-                SELECT pn.id, COALESCE(COUNT(a.id), 0) as activity_count
-                FROM person_norm pn
-                LEFT JOIN activity a ON pn.id = a.person_id 
-                    AND a.activity_date >= DATE_SUB(NOW(), INTERVAL {self.activity_time_range_days} DAY)
-                GROUP BY pn.id
-            ) activity_dist
-            GROUP BY activity_range
-            ORDER BY 
-                CASE activity_range
-                    WHEN '0' THEN 1
-                    WHEN '1-10' THEN 2
-                    WHEN '11-50' THEN 3
-                    WHEN '51-100' THEN 4
-                    WHEN '101-500' THEN 5
-                    WHEN '501-1000' THEN 6
-                    ELSE 7
-                END
-            """
-            buckets = self.execute_query(bucket_query)
             relationship['activity_count_buckets'] = [
+                self._zero_bucket('person_count', buckets, self._cached_counts['person_norm_rows'])
+            ] + [
                 {
                     'range': b['activity_range'],
                     'person_count': b['person_count'],
-                    'percentage': round(b['percentage'], 2)
+                    'percentage': b['percentage']
                 }
                 for b in buckets
             ]
@@ -462,41 +641,50 @@ class DataRelationshipAnalyzer:
                 'note': f'Analysis based on last {self.activity_time_range_days} days of activity data'
             }
             
-            self.results['relationships']['person_activity'] = relationship
+            self._store_result('relationships', 'person_activity', relationship)
             print(f"  ✓ found {relationship['unique_persons']} persons, {relationship['unique_activities']} activities")
     
-    def analyze_account_list_patterns(self):
+    def analyze_account_list_patterns(self, connection):
         """analyze account_list_member patterns"""
         print("\nanalyze account_list_member patterns...")
         
+        # scan account_list_member once per grouping key, follow-up queries read the small aggregates
+        self._create_temp_table(connection, 'tmp_list_sizes', """
+            SELECT
+                account_list_id,
+                COUNT(*) AS member_count
+            FROM account_list_member
+            GROUP BY account_list_id
+        """)
+        self._create_temp_table(connection, 'tmp_account_list_counts', """
+            SELECT
+                account_id,
+                COUNT(*) AS list_count
+            FROM account_list_member
+            GROUP BY account_id
+        """)
+        
         # 1. basic list statistics
         query = """
-            WITH ListSizes AS (
+            WITH ListStats AS (
                 SELECT
-                    account_list_id,
-                    COUNT(*) AS member_count
-                FROM account_list_member
-                GROUP BY account_list_id
-            ),
-            ListStats AS (
-                SELECT
-                    AVG(member_count) AS avg_members_per_list,
+                    COALESCE(CAST(ROUND(AVG(member_count), 2) AS DOUBLE), 0) AS avg_members_per_list,
                     MIN(member_count) AS min_members_per_list,
                     MAX(member_count) AS max_members_per_list,
-                    STDDEV(member_count) AS std_members_per_list
-                FROM ListSizes
+                    COALESCE(CAST(ROUND(STDDEV(member_count), 2) AS DOUBLE), 0) AS std_members_per_list,
+                    COUNT(*) AS unique_lists,
+                    SUM(member_count) AS total_memberships
+                FROM tmp_list_sizes
             ),
             OverallStats AS (
                 SELECT
-                    APPROX_COUNT_DISTINCT(account_list_id) AS unique_lists,
-                    APPROX_COUNT_DISTINCT(account_id) AS unique_accounts,
-                    COUNT(*) AS total_memberships
-                FROM account_list_member
+                    COUNT(*) AS unique_accounts
+                FROM tmp_account_list_counts
             )
             SELECT
-                o.unique_lists,
+                s.unique_lists,
                 o.unique_accounts,
-                o.total_memberships,
+                s.total_memberships,
                 s.avg_members_per_list,
                 s.min_members_per_list,
                 s.max_members_per_list,
@@ -504,7 +692,48 @@ class DataRelationshipAnalyzer:
             FROM OverallStats o
             CROSS JOIN ListStats s;
         """
-        result = self.execute_query(query)
+        
+        # 2. list size distribution
+        bucket_query = """
+        SELECT 
+            CASE 
+                WHEN member_count BETWEEN 1 AND 10 THEN '1-10'
+                WHEN member_count BETWEEN 11 AND 50 THEN '11-50'
+                WHEN member_count BETWEEN 51 AND 100 THEN '51-100'
+                WHEN member_count BETWEEN 101 AND 500 THEN '101-500'
+                WHEN member_count BETWEEN 501 AND 1000 THEN '501-1000'
+                WHEN member_count BETWEEN 1001 AND 5000 THEN '1001-5000'
+                ELSE '5000+'
+            END as size_range,
+            COUNT(*) as list_count,
+            CAST(ROUND(COUNT(*) * 100.0 / SUM(COUNT(*)) OVER (), 2) AS DOUBLE) as percentage
+        FROM tmp_list_sizes
+        GROUP BY size_range
+        ORDER BY 
+            CASE size_range
+                WHEN '1-10' THEN 1
+                WHEN '11-50' THEN 2
+                WHEN '51-100' THEN 3
+                WHEN '101-500' THEN 4
+                WHEN '501-1000' THEN 5
+                WHEN '1001-5000' THEN 6
+                ELSE 7
+            END
+        """
+        
+        # 3. number of lists per account
+        membership_query = """
+        SELECT 
+            COALESCE(CAST(ROUND(AVG(list_count), 2) AS DOUBLE), 0) as avg_lists_per_account,
+            MIN(list_count) as min_lists_per_account,
+            MAX(list_count) as max_lists_per_account,
+            COALESCE(CAST(ROUND(STDDEV(list_count), 2) AS DOUBLE), 0) as std_lists_per_account
+        FROM tmp_account_list_counts
+        """
+        
+        result, buckets, membership_result = self.execute_many_queries(
+            connection, [query, bucket_query, membership_query]
+        )
         
         if result:
             data = result[0]
@@ -512,132 +741,182 @@ class DataRelationshipAnalyzer:
                 'unique_lists': data['unique_lists'],
                 'unique_accounts': data['unique_accounts'],
                 'total_memberships': data['total_memberships'],
-                'avg_members_per_list': round(float(data['avg_members_per_list']), 2) if data['avg_members_per_list'] else 0,
+                'avg_members_per_list': data['avg_members_per_list'],
                 'min_members_per_list': data['min_members_per_list'],
                 'max_members_per_list': data['max_members_per_list'],
-                'std_members_per_list': round(float(data['std_members_per_list']), 2) if data['std_members_per_list'] else 0
+                'std_members_per_list': data['std_members_per_list']
             }
             
-            # 2. list size distribution
-            bucket_query = """
-            SELECT 
-                CASE 
-                    WHEN member_count BETWEEN 1 AND 10 THEN '1-10'
-                    WHEN member_count BETWEEN 11 AND 50 THEN '11-50'
-                    WHEN member_count BETWEEN 51 AND 100 THEN '51-100'
-                    WHEN member_count BETWEEN 101 AND 500 THEN '101-500'
-                    WHEN member_count BETWEEN 501 AND 1000 THEN '501-1000'
-                    WHEN member_count BETWEEN 1001 AND 5000 THEN '1001-5000'
-                    ELSE '5000+'
-                END as size_range,
-                COUNT(*) as list_count,
-                COUNT(*) * 100.0 / (SELECT APPROX_COUNT_DISTINCT(account_list_id) FROM account_list_member) as percentage
-            FROM (
-                SELECT account_list_id, COUNT(*) as member_count
-                FROM account_list_member
-                GROUP BY account_list_id
-            ) list_sizes
-            GROUP BY size_range
-            ORDER BY 
-                CASE size_range
-                    WHEN '1-10' THEN 1
-                    WHEN '11-50' THEN 2
-                    WHEN '51-100' THEN 3
-                    WHEN '101-500' THEN 4
-                    WHEN '501-1000' THEN 5
-                    WHEN '1001-5000' THEN 6
-                    ELSE 7
-                END
-            """
-            buckets = self.execute_query(bucket_query)
             pattern['list_size_buckets'] = [
                 {
                     'range': b['size_range'],
                     'list_count': b['list_count'],
-                    'percentage': round(b['percentage'], 2)
+                    'percentage': b['percentage']
                 }
                 for b in buckets
             ]
             
-            # 3. number of lists per account
-            membership_query = """
-            SELECT 
-                AVG(list_count) as avg_lists_per_account,
-                MIN(list_count) as min_lists_per_account,
-                MAX(list_count) as max_lists_per_account,
-                STDDEV(list_count) as std_lists_per_account
-            FROM (
-                SELECT account_id, COUNT(*) as list_count
-                FROM account_list_member
-                GROUP BY account_id
-            ) account_memberships
-            """
-            membership_result = self.execute_query(membership_query)
             if membership_result:
                 m_data = membership_result[0]
-                pattern['avg_lists_per_account'] = round(float(m_data['avg_lists_per_account']), 2) if m_data['avg_lists_per_account'] else 0
+                pattern['avg_lists_per_account'] = m_data['avg_lists_per_account']
                 pattern['min_lists_per_account'] = m_data['min_lists_per_account']
                 pattern['max_lists_per_account'] = m_data['max_lists_per_account']
-                pattern['std_lists_per_account'] = round(float(m_data['std_lists_per_account']), 2) if m_data['std_lists_per_account'] else 0
+                pattern['std_lists_per_account'] = m_data['std_lists_per_account']
             
-            self.results['relationships']['account_list_member'] = pattern
+            self._store_result('relationships', 'account_list_member', pattern)
             print(f"  ✓ found {pattern['unique_lists']} lists, {pattern['unique_accounts']} accounts")
+        
+        self._drop_temp_table(connection, 'tmp_list_sizes')
+        self._drop_temp_table(connection, 'tmp_account_list_counts')
 
     
-    def analyze_temporal_patterns(self):
+    def analyze_temporal_patterns(self, connection):
         """analyze temporal patterns"""
         print("\nanalyze temporal patterns...")
         
         temporal = {}
         
         # 1. activity temporal patterns
+        # group on a single month key instead of YEAR() + MONTH(), the rows arrive ordered on that key
         activity_temporal_query = f"""
         SELECT 
-            YEAR(activity_date) as year,
-            MONTH(activity_date) as month,
+            DATE_FORMAT(activity_date, '%Y-%m-01') as activity_month,
             COUNT(*) as count,
-            APPROX_COUNT_DISTINCT(account_id) as unique_accounts,
-            APPROX_COUNT_DISTINCT(person_id) as unique_persons
-        FROM activity
-        WHERE activity_date IS NOT NULL AND activity_date >= DATE_SUB(NOW(), INTERVAL {self.activity_time_range_days} DAY)
-        GROUP BY YEAR(activity_date), MONTH(activity_date)
-        ORDER BY year DESC, month DESC
+            {self._count_distinct('account_id')} as unique_accounts,
+            {self._count_distinct('person_id')} as unique_persons
+        FROM tmp_recent_activity
+        GROUP BY activity_month
+        ORDER BY activity_month DESC
         LIMIT 24
         """
-        activity_temporal = self.execute_query(activity_temporal_query)
+        activity_temporal = self.execute_query_tuples(connection, activity_temporal_query)
         temporal['activity_monthly'] = [
             {
-                'year': t['year'],
-                'month': t['month'],
-                'count': t['count'],
-                'unique_accounts': t['unique_accounts'],
-                'unique_persons': t['unique_persons']
+                'year': int(str(t[0])[:4]),
+                'month': int(str(t[0])[5:7]),
+                'count': t[1],
+                'unique_accounts': t[2],
+                'unique_persons': t[3]
             }
             for t in activity_temporal
         ]
 
-        self.results['data_flow_patterns']['temporal'] = temporal
+        self._store_result('data_flow_patterns', 'temporal', temporal)
         print("  ✓ analyze temporal patterns completed")
     
+    def _store_result(self, section: str, step: str, value: Dict):
+        """record the result of one analyze step, mark it completed and persist the partial results"""
+        with self._results_lock:
+            self.results[section][step] = _coerce(value)
+            self.results['metadata']['completed_steps'].append(step)
+            self._persist()
+    
+    def _persist(self, results: Dict = None):
+        """write the current results to the output file, caller must hold the results lock"""
+        if not self.output_path:
+            return
+        results = self.results if results is None else results
+        if orjson:
+            with open(self.output_path, 'wb') as f:
+                f.write(orjson.dumps(results, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS))
+        else:
+            with open(self.output_path, 'w', encoding='utf-8') as f:
+                json.dump(results, f, indent=2, ensure_ascii=False)
+    
+    def _write_list_files(self) -> Dict:
+        """write the bucket / distribution lists as compact NDJSON next to the output file, return a copy of the results pointing at them"""
+        output_dir, output_name = os.path.split(self.output_path)
+        relationships = {}
+        for rel_name, relationship in self.results['relationships'].items():
+            relationship = dict(relationship)
+            for field, value in list(relationship.items()):
+                if not isinstance(value, list) or not field.endswith(('_buckets', '_distribution')):
+                    continue
+                file_name = f"{output_name}.{rel_name}.{field}.ndjson"
+                if orjson:
+                    with open(os.path.join(output_dir, file_name), 'wb') as f:
+                        f.writelines(orjson.dumps(row) + b'\n' for row in value)
+                else:
+                    with open(os.path.join(output_dir, file_name), 'w', encoding='utf-8') as f:
+                        f.writelines(json.dumps(row, separators=(',', ':'), ensure_ascii=False) + '\n' for row in value)
+                relationship[field] = {'@file': file_name, 'n': len(value)}
+            relationships[rel_name] = relationship
+        return {**self.results, 'relationships': relationships}
+    
+    def _load_partial_results(self):
+        """resume from the output file of a previous run that did not complete every step"""
+        if not os.path.exists(self.output_path):
+            return
+        try:
+            with open(self.output_path, 'r', encoding='utf-8') as f:
+                previous = json.load(f)
+        except ValueError as e:
+            print(f"⚠️  ignore unreadable previous results {self.output_path}: {e}")
+            return
+        
+        metadata = previous.get('metadata', {})
+        completed_steps = metadata.get('completed_steps', [])
+        if (metadata.get('database') != self.results['metadata']['database']
+                or metadata.get('activity_time_range_days') != self.activity_time_range_days
+                or metadata.get('exact_counts', False) != self.exact_counts
+                or len(completed_steps) >= len(self.STEPS)):
+            # different configuration or a finished run, start over
+            return
+        
+        # lists written as NDJSON files by an older run are read back inline
+        output_dir = os.path.dirname(self.output_path)
+        for relationship in previous.get('relationships', {}).values():
+            for field, value in list(relationship.items()):
+                if isinstance(value, dict) and '@file' in value:
+                    try:
+                        with open(os.path.join(output_dir, value['@file']), 'r', encoding='utf-8') as f:
+                            relationship[field] = [json.loads(line) for line in f if line.strip()]
+                    except (OSError, ValueError) as e:
+                        print(f"⚠️  ignore previous results {self.output_path}, list file unreadable: {e}")
+                        return
+        
+        self.results = previous
+        print(f"✓ resume from {self.output_path}, completed steps: {', '.join(completed_steps) or 'none'}")
+    
     def save_results(self, output_file: str = 'data_relationship_analysis.json'):
         """save analysis results"""
-        output_path = os.path.join(os.path.dirname(__file__), output_file)
-        with open(output_path, 'w', encoding='utf-8') as f:
-            json.dump(self.results, f, indent=2, ensure_ascii=False, cls=DecimalEncoder)
-        print(f"\n✓ analysis results saved to: {output_path}")
+        self.output_path = os.path.join(os.path.dirname(__file__), output_file)
+        with self._results_lock:
+            if len(self.results['metadata']['completed_steps']) < len(self.STEPS):
+                # a step failed, keep the lists inline so that the next run resumes from this file alone
+                self._persist()
+                print(f"\n⚠️  partial analysis results saved to: {self.output_path}, rerun to resume the failed steps")
+                return
+            self._persist(self._write_list_files())
+        print(f"\n✓ analysis results saved to: {self.output_path}")
     
     def run(self, output_file: str = 'data_relationship_analysis.json'):
         """execute full data relationship analysis"""
+        self.output_path = os.path.join(os.path.dirname(__file__), output_file)
+        self._load_partial_results()
         try:
             self.connect()
             
             print("\n" + "="*60 + " data relationship analysis " + "="*60)
             
-            self.analyze_account_person_relationship()
-            self.analyze_account_activity_relationship()
-            self.analyze_person_activity_relationship()
-            self.analyze_account_list_patterns()
-            self.analyze_temporal_patterns()
+            # the analyzers touch different tables and are independent, run them concurrently,
+            # except the activity steps which run in sequence over one materialized recent activity slice
+            completed_steps = self.results['metadata']['completed_steps']
+            pending = [step for step in self.STEPS if step not in completed_steps]
+            steps = [getattr(self, self.STEPS[step]) for step in pending if step not in self.RECENT_ACTIVITY_STEPS]
+            activity_steps = [getattr(self, self.STEPS[step]) for step in pending if step in self.RECENT_ACTIVITY_STEPS]
+            if pending:
+                self._prime_counts()
+            with ThreadPoolExecutor(max_workers=self.pool_size) as executor:
+                futures = {executor.submit(self._run_with_connection, step): step.__name__ for step in steps}
+                if activity_steps:
+                    futures[executor.submit(self._run_recent_activity_steps, activity_steps)] = 'recent activity steps'
+                for future in as_completed(futures):
+                    try:
+                        future.result()
+                    except Exception as e:
+                        # the step is not marked completed, a rerun resumes it
+                        print(f"✗ {futures[future]} failed: {e}")
             
             self.save_results(output_file)
         except Exception as e:
@@ -656,6 +935,9 @@ def main():
         'user': os.getenv('DB_USER', 'root'),
         'password': os.getenv('DB_PASSWORD', ''),
         'database': os.getenv('DB_NAME', 'tenant'),
+        'pool_size': int(os.getenv('POOL_SIZE', '5')),  # concurrent analyzers / connections
+        'create_indexes': os.getenv('CREATE_INDEXES', 'false').lower() == 'true',  # apply migrations/ensure_indexes.sql
+        'exact_counts': os.getenv('EXACT_COUNTS', 'false').lower() == 'true',  # COUNT(DISTINCT) instead of approximate counts
         # optimization options
         'activity_time_range_days': int(os.getenv('ACTIVITY_TIME_RANGE_DAYS', '90'))  # 90 days
     }
@@ -667,6 +949,9 @@ def main():
     print("  - data flow analysis")
     print(f"\noptimization configuration:")
     print(f"  - activity time range: {config['activity_time_range_days']} days")
+    print(f"  - connection pool size: {config['pool_size']}")
+    print(f"  - create indexes: {config['create_indexes']}")
+    print(f"  - exact distinct counts: {config['exact_counts']}")
     
     # create analyzer and run
     analyzer = DataRelationshipAnalyzer(config)
@@ -0,0 +1,19 @@
+-- indexes used by the GROUP BY / JOIN / time range filters of data_relationship_analyzer.py and sample_account_analyzer.py
+-- applied on connect of data_relationship_analyzer.py when CREATE_INDEXES=true, requires ALTER/INDEX privileges
+-- indexes that already exist (by name, in information_schema.STATISTICS) are skipped, one CREATE INDEX per statement
+
+-- recent activity slices: range scan on activity_date, covering account_id / person_id / id
+CREATE INDEX idx_activity_date_acc ON activity(activity_date, account_id, person_id, id);
+
+-- sampled activities of the sample accounts: point lookup per account then range scan on activity_date,
+-- covering every column _sample_activity copies so the activity rows are never read
+CREATE INDEX idx_activity_acc_date ON activity(account_id, activity_date, id, person_id, activityType);
+
+-- per-account person counts
+CREATE INDEX idx_person_norm_account ON person_norm(account_id);
+
+-- per-list member counts
+CREATE INDEX idx_alm_list ON account_list_member(account_list_id, account_id);
+
+-- per-account list counts
+CREATE INDEX idx_alm_account ON account_list_member(account_id);
@@ -5,34 +5,103 @@ for getting data statistics, for generating simulated data
 
 import json
 import os
-from datetime import datetime
-from decimal import Decimal
+import queue
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
+from datetime import datetime, timedelta
 import traceback
-from typing import Dict, List, Any
+from typing import Dict, List, Any, Tuple
 import pymysql
-from pymysql.cursors import DictCursor
+from pymysql.cursors import DictCursor, SSDictCursor
 
+try:
+    import orjson
+except ImportError:  # optional, fall back to the stdlib json encoder
+    orjson = None
 
-class DecimalEncoder(json.JSONEncoder):
-    """custom json encoder for decimal type"""
-    def default(self, obj):
-        if isinstance(obj, Decimal):
-            return float(obj)
-        return super(DecimalEncoder, self).default(obj)
+
+def _q(name: str) -> str:
+    """quote a table / column name, identifiers cannot be bound as parameters so they are validated instead"""
+    if not re.fullmatch(r'[A-Za-z0-9_]+', name):
+        raise ValueError(f"invalid identifier: {name!r}")
+    return f"`{name}`"
+
+
+def _dumps(value, pretty: bool = False) -> bytes:
+    """serialize results to compact JSON, indented when pretty, Decimal values that slip through become floats"""
+    if orjson:
+        return orjson.dumps(value, default=float, option=orjson.OPT_INDENT_2 if pretty else None)
+    if pretty:
+        return json.dumps(value, indent=2, ensure_ascii=False, default=float).encode('utf-8')
+    return json.dumps(value, separators=(',', ':'), ensure_ascii=False, default=float).encode('utf-8')
 
 
 class ProductionDataProfiler:
     """production environment data feature analyzer"""
     
+    # aggregates computed for every column of a kind in the fused per-table query, key -> SQL expression
+    # unique_count is added separately for DISTINCT_COUNT_KINDS, its expression depends on the dialect (_distinct_count_expression)
+    COLUMN_AGGREGATES = {
+        'numeric': {
+            'non_null_count': "COUNT({column})",
+            'min_value': "MIN({column})",
+            'max_value': "MAX({column})",
+            'avg_value': "AVG({column})",
+            'std_dev': "STDDEV({column})"
+        },
+        'string': {
+            'non_null_count': "COUNT({column})",
+            'avg_length': "AVG(LENGTH({column}))",
+            'min_length': "MIN(LENGTH({column}))",
+            'max_length': "MAX(LENGTH({column}))"
+        },
+        'json': {
+            'non_null_count': "COUNT({column})",
+            'avg_length': "AVG(LENGTH({column}))"
+        },
+        'other': {
+            'non_null_count': "COUNT({column})"
+        }
+    }
+    
+    # column kinds that also get a unique_count when distinct counts are enabled
+    DISTINCT_COUNT_KINDS = ('numeric', 'string')
+    
+    # null percentage of a column, computed by the server next to its aggregates
+    NULL_PERCENTAGE = "COALESCE(ROUND((COUNT(*) - COUNT({column})) * 100.0 / NULLIF(COUNT(*), 0), 2), 0)"
+    
+    # types stored off-page, LENGTH() over every row would read all of them, their length stats come from a LIMIT sample
+    LONG_TEXT_TYPES = ('mediumtext', 'longtext', 'json')
+    LENGTH_AGGREGATES = ('avg_length', 'min_length', 'max_length')
+    
+    # pooled connections idle for longer than this are pinged (and reconnected) before they are used
+    PING_IDLE_SECONDS = 30
+    
     def __init__(self, config: Dict[str, Any]):
         """
         :param config: database connection configuration
         """
         self.config = config
-        self.connection = None
+        self.analysis_time = datetime.now()  # time range filters are relative to this, so every query sees the same cutoff
+        self.pool = None
+        self.pool_size = config.get('pool_size', 5)  # concurrent queries / connections, keep it well below max_connections
+        self.pool_recycle_seconds = config.get('pool_recycle_seconds', 3600)  # reopen pooled connections older than this
+        self._results_lock = threading.Lock()
+        self._columns_cache = {}  # table name -> columns from information_schema
+        self._rowcount_cache = {}  # (table name, where clause, params) -> row count
+        self._output = None  # temporary results file the tables are streamed to while running, renamed when complete
+        self._tables_written = 0
+        self._output_index = 0  # position in core_tables of the next table to append to the results file
+        self._failed_tables = set()  # tables whose analysis raised, skipped in the results file
+        self.pretty_json = config.get('pretty_json', False)  # indent the results file, compact by default
+        self.enable_distinct_counts = config.get('enable_distinct_counts', True)
+        self.has_approx_distinct = True  # probed in connect()
         self.results = {
             'metadata': {
-                'analysis_date': datetime.now().isoformat(),
+                'analysis_date': self.analysis_time.isoformat(),
                 'database': config.get('database', 'unknown')
             },
             'tables': {}
@@ -50,61 +119,164 @@ class ProductionDataProfiler:
         
         # configuration options
         self.max_columns_to_analyze = config.get('max_columns_to_analyze', 50)
+        self.length_sample_rows = config.get('length_sample_rows', 100000)  # rows read for the length stats of long text columns
+        # categorical value distributions of tables with at least this many rows are counted on a 1 / modulus primary key sample
+        self.distribution_sample_min_rows = config.get('distribution_sample_min_rows', 1000000)
+        self.distribution_sample_modulus = config.get('distribution_sample_modulus', 100)
         
         # large table specific optimization strategies
+        # sampling keeps every sample_modulus-th primary key, so the sample rate is rounded to 1 / sample_modulus
+        activity_sample_rate = config.get('activity_sample_rate', 0.01)
+        if not 0 < activity_sample_rate <= 1:
+            raise ValueError(f"activity_sample_rate must be in (0, 1], got {activity_sample_rate}")
+        activity_sample_modulus = max(1, round(1 / activity_sample_rate))
+        if abs(1 / activity_sample_modulus - activity_sample_rate) > activity_sample_rate * 0.05:
+            print(f"⚠️  activity sample rate {activity_sample_rate} is applied as 1/{activity_sample_modulus} ({100 / activity_sample_modulus:.1f}%)")
         self.large_table_configs = {
             'activity': {
-                'sample_rate': config.get('activity_sample_rate', 0.01),  # 1% sampling
+                'sample_rate': 1 / activity_sample_modulus,  # 1% sampling
+                'sample_key': 'id',
+                'sample_modulus': activity_sample_modulus,
                 'time_range_days': config.get('activity_time_range_days', 90),  # last 90 days
                 'time_column': 'activity_date'
             }
         }
     
+    def _open_connection(self):
+        """open one database connection"""
+        return pymysql.connect(
+            host=self.config['host'],
+            port=self.config.get('port', 3306),
+            user=self.config['user'],
+            password=self.config['password'],
+            database=self.config['database'],
+            cursorclass=DictCursor
+        )
+    
     def connect(self):
-        """connect to database"""
+        """open a pool of database connections, the column queries run concurrently on them"""
         try:
-            self.connection = pymysql.connect(
-                host=self.config['host'],
-                port=self.config.get('port', 3306),
-                user=self.config['user'],
-                password=self.config['password'],
-                database=self.config['database'],
-                cursorclass=DictCursor
-            )
-            print(f"✓ connect to database: {self.config['database']}")
+            self.pool = queue.Queue()
+            for _ in range(self.pool_size):
+                now = time.monotonic()
+                # pooled entries are (connection, opened at, last used at)
+                self.pool.put((self._open_connection(), now, now))
+            print(f"✓ connect to database: {self.config['database']} ({self.pool_size} connections)")
         except Exception as e:
             print(f"✗ connect to database failed: {e}, {traceback.format_exc()}")
+            self.close()
             raise
+        
+        self.has_approx_distinct = self._probe_approx_distinct()
+        if self.enable_distinct_counts and not self.has_approx_distinct:
+            print("⚠️  APPROX_COUNT_DISTINCT is not supported, unique counts fall back to GROUP BY counts")
+    
+    def _probe_approx_distinct(self) -> bool:
+        """check whether the server supports APPROX_COUNT_DISTINCT (Doris / StarRocks do, vanilla MySQL does not)"""
+        try:
+            with self.get_connection() as connection, connection.cursor() as cursor:
+                cursor.execute("SELECT APPROX_COUNT_DISTINCT(1) as probe")
+                cursor.fetchall()
+            return True
+        except pymysql.MySQLError:
+            return False
+    
+    def _distinct_count_expression(self, table_name: str, column_name: str, where_clause: str, where_params: tuple) -> Tuple[str, tuple]:
+        """SQL and parameters for the distinct count of a column, HLL based when available, otherwise counted over a GROUP BY"""
+        if self.has_approx_distinct:
+            return f"APPROX_COUNT_DISTINCT({_q(column_name)})", ()
+        return f"(SELECT COUNT(*) FROM (SELECT {_q(column_name)} FROM {_q(table_name)} {self._where_not_null(where_clause, column_name)} GROUP BY {_q(column_name)}) q)", where_params
+    
+    def _where_not_null(self, where_clause: str, column_name: str) -> str:
+        """extend the table filter with a NOT NULL condition on the column"""
+        if where_clause:
+            return f"{where_clause} AND {_q(column_name)} IS NOT NULL"
+        return f"WHERE {_q(column_name)} IS NOT NULL"
     
     def close(self):
-        """close database connection"""
-        if self.connection:
-            self.connection.close()
+        """close all pooled database connections"""
+        if self.pool:
+            while not self.pool.empty():
+                self.pool.get_nowait()[0].close()
             print("✓ database connection closed")
     
-    def execute_query(self, query: str) -> List[Dict]:
-        """execute sql query and return result"""
+    @contextmanager
+    def get_connection(self):
+        """borrow a connection from the pool and give it back when done"""
+        connection, opened_at, last_used_at = self.pool.get()
         try:
-            with self.connection.cursor() as cursor:
-                cursor.execute(query)
+            now = time.monotonic()
+            if now - opened_at >= self.pool_recycle_seconds:
+                # recycle old connections before the server wait_timeout can drop them
+                connection.close()
+                connection, opened_at = self._open_connection(), now
+            elif now - last_used_at >= self.PING_IDLE_SECONDS:
+                # an idle connection may have been dropped during a long table scan on another one
+                connection.ping(reconnect=True)
+        except Exception:
+            self.pool.put((connection, opened_at, last_used_at))
+            raise
+        try:
+            yield connection
+        finally:
+            self.pool.put((connection, opened_at, time.monotonic()))
+    
+    def execute_query(self, query: str, params: tuple = None) -> List[Dict]:
+        """execute sql query on a pooled connection and return result"""
+        try:
+            with self.get_connection() as connection, connection.cursor() as cursor:
+                cursor.execute(query, params)
                 return cursor.fetchall()
         except Exception as e:
             print(f"✗ execute query failed: {e}, {traceback.format_exc()}")
             print(f"SQL: {query}")
             return []
     
-    def get_table_row_count(self, table_name: str, where_clause: str = "") -> int:
-        """get table row count"""
-        query = f"SELECT COUNT(*) as count FROM `{table_name}`"
+    def execute_scalar_row(self, query: str, params: tuple = None) -> Dict:
+        """execute a single-row aggregate query with an unbuffered cursor and return the row, None on failure"""
+        try:
+            with self.get_connection() as connection, connection.cursor(SSDictCursor) as cursor:
+                cursor.execute(query, params)
+                return cursor.fetchone()
+        except Exception as e:
+            print(f"✗ execute query failed: {e}, {traceback.format_exc()}")
+            print(f"SQL: {query}")
+            return None
+    
+    def get_table_row_count(self, table_name: str, where_clause: str = "", params: tuple = None) -> int:
+        """get table row count, where_clause and params as built by _build_where_clause, counted once per run"""
+        key = (table_name, where_clause, params)
+        if key in self._rowcount_cache:
+            return self._rowcount_cache[key]
+        
+        query = f"SELECT COUNT(*) as count FROM {_q(table_name)}"
         if where_clause:
-            query += f" WHERE {where_clause}"
-        result = self.execute_query(query)
-        return result[0]['count'] if result else 0
+            query += f" {where_clause}"
+        row = self.execute_scalar_row(query, params)
+        if not row:
+            return 0
+        with self._results_lock:
+            self._rowcount_cache[key] = row['count']
+        return row['count']
     
-    def get_table_columns(self, table_name: str) -> List[Dict]:
-        """get table columns"""
+    def preload_table_row_counts(self, table_names: List[str]):
+        """count the unfiltered rows of several tables with one UNION ALL query into the row count cache"""
+        if not table_names:
+            return
+        query = "\nUNION ALL\n".join(
+            f"SELECT %s as table_name, COUNT(*) as count FROM {_q(table_name)}" for table_name in table_names
+        )
+        rows = self.execute_query(query, tuple(table_names))
+        with self._results_lock:
+            for row in rows:
+                self._rowcount_cache[(row['table_name'], "", ())] = row['count']
+    
+    def preload_table_columns(self, table_names: List[str]):
+        """load the columns of several tables with one information_schema query into the columns cache"""
+        placeholders = ', '.join(['%s'] * len(table_names))
         query = f"""
         SELECT 
+            TABLE_NAME as table_name,
             COLUMN_NAME as column_name,
             DATA_TYPE as data_type,
             IS_NULLABLE as is_nullable,
@@ -115,274 +287,343 @@ class ProductionDataProfiler:
             COLUMN_TYPE as column_type,
             COLUMN_KEY as column_key
         FROM information_schema.COLUMNS
-        WHERE TABLE_SCHEMA = '{self.config['database']}'
-        AND TABLE_NAME = '{table_name}'
-        ORDER BY ORDINAL_POSITION
+        WHERE TABLE_SCHEMA = %s
+        AND TABLE_NAME IN ({placeholders})
+        ORDER BY TABLE_NAME, ORDINAL_POSITION
         """
-        return self.execute_query(query)
+        columns_by_table = {table_name: [] for table_name in table_names}
+        for column in self.execute_query(query, (self.config['database'], *table_names)):
+            columns_by_table.setdefault(column.pop('table_name'), []).append(column)
+        self._columns_cache.update(columns_by_table)
+    
+    def get_table_columns(self, table_name: str) -> List[Dict]:
+        """get table columns, from the columns cache when preloaded"""
+        if table_name not in self._columns_cache:
+            self.preload_table_columns([table_name])
+        return self._columns_cache[table_name]
+    
+    def get_unique_key_columns(self, table_name: str) -> set:
+        """names of the columns that are a single column primary / unique key, their values are unique by definition"""
+        columns = self.get_table_columns(table_name)
+        unique_columns = set()
+        for key in ('PRI', 'UNI'):
+            key_columns = [column['column_name'] for column in columns if column['column_key'] == key]
+            # several columns with the same key are usually one composite key, none of them is unique on its own
+            if len(key_columns) == 1:
+                unique_columns.update(key_columns)
+        return unique_columns
     
-    def _build_where_clause(self, table_name: str, optimization_config: Dict = None) -> str:
-        """build WHERE clause for large table optimization"""
+    def _build_where_clause(self, table_name: str, optimization_config: Dict = None) -> Tuple[str, tuple]:
+        """build WHERE clause and its parameters for large table optimization"""
         if not optimization_config:
-            return ""
+            return "", ()
         
         conditions = []
+        params = []
         
         # add time range filter
         if 'time_column' in optimization_config and 'time_range_days' in optimization_config:
             time_column = optimization_config['time_column']
             days = optimization_config['time_range_days']
-            conditions.append(f"`{time_column}` >= DATE_SUB(NOW(), INTERVAL {days} DAY)")
+            # a constant cutoff instead of DATE_SUB(NOW(), ...) lets the planner use a range scan on the time column
+            conditions.append(f"{_q(time_column)} >= %s")
+            params.append((self.analysis_time - timedelta(days=days)).strftime('%Y-%m-%d %H:%M:%S'))
         
-        # add sampling filter
-        if 'sample_rate' in optimization_config:
-            sample_rate = optimization_config['sample_rate']
-            conditions.append(f"RAND() < {sample_rate}")
+        # add sampling filter, a modulo on the primary key is deterministic and does not need a random number per row
+        if 'sample_key' in optimization_config and optimization_config.get('sample_modulus', 1) > 1:
+            sample_key = optimization_config['sample_key']
+            sample_modulus = optimization_config['sample_modulus']
+            conditions.append(f"MOD({_q(sample_key)}, %s) = 0")
+            params.append(sample_modulus)
         
-        return f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        return (f"WHERE {' AND '.join(conditions)}" if conditions else ""), tuple(params)
+    
+    def _column_kind(self, data_type: str) -> str:
+        """classify a column by data type, columns of the same kind share one fused aggregate query"""
+        data_type = data_type.lower()
+        if data_type in ['int', 'bigint', 'tinyint', 'smallint', 'mediumint', 'decimal', 'float', 'double']:
+            return 'numeric'
+        elif data_type in ['varchar', 'char', 'text', 'mediumtext', 'longtext']:
+            return 'string'
+        elif data_type in ['datetime', 'date', 'timestamp']:
+            return 'datetime'
+        elif data_type == 'json':
+            return 'json'
+        elif data_type == 'boolean':
+            # Boolean column can be treated as a categorical column
+            return 'string'
+        # other types only get basic statistics
+        return 'other'
+    
+    def _is_indexed_string_column(self, column: Dict) -> bool:
+        """indexed string columns get their own NOT NULL query that the column index can serve"""
+        return (self._column_kind(column['data_type']) == 'string'
+                and column['column_key'] in ('PRI', 'UNI', 'MUL')
+                and column['data_type'].lower() not in self.LONG_TEXT_TYPES)
     
-    def analyze_numeric_column(self, table_name: str, column_name: str, optimization_config: Dict = None) -> Dict:
-        """analyze numeric column statistics"""
-        where_clause = self._build_where_clause(table_name, optimization_config)
+    def _optimization_info(self, optimization_config: Dict = None) -> str:
+        """describe the large table optimization for progress output"""
+        if not optimization_config:
+            return ""
+        return f" [optimized: {optimization_config.get('sample_rate', 0)*100:.1f}% sample, {optimization_config.get('time_range_days', 'N/A')} days]"
+    
+    def analyze_column_group(self, table_name: str, kind: str, columns: List[Dict], optimization_config: Dict = None) -> Dict[str, Dict]:
+        """compute the aggregates of all columns of one kind in a single scan, return statistics by column name"""
+        print(f"  - analyze {len(columns)} {kind} columns: {', '.join(c['column_name'] for c in columns)}{self._optimization_info(optimization_config)}")
+        where_clause, where_params = self._build_where_clause(table_name, optimization_config)
         
+        aggregates = dict(self.COLUMN_AGGREGATES[kind])
+        if kind in self.DISTINCT_COUNT_KINDS and self.enable_distinct_counts:
+            aggregates['unique_count'] = None
+        long_columns = [column for column in columns if column['data_type'].lower() in self.LONG_TEXT_TYPES]
+        unique_columns = self.get_unique_key_columns(table_name)
+        projections = ["COUNT(*) as total_count"]
+        params = []
+        for i, column in enumerate(columns):
+            column_name = column['column_name']
+            for key, expression in aggregates.items():
+                if key in self.LENGTH_AGGREGATES and column in long_columns:
+                    continue
+                if key == 'unique_count' and column_name in unique_columns:
+                    continue
+                if key == 'unique_count':
+                    expression, expression_params = self._distinct_count_expression(table_name, column_name, where_clause, where_params)
+                    params.extend(expression_params)
+                else:
+                    expression = expression.format(column=_q(column_name))
+                projections.append(f"{expression} as c{i}_{key}")
+            projections.append(f"{self.NULL_PERCENTAGE.format(column=_q(column_name))} as c{i}_null_percentage")
+        select_list = ',\n            '.join(projections)
         query = f"""
         SELECT 
-            COUNT(*) as total_count,
-            COUNT(`{column_name}`) as non_null_count,
-            APPROX_COUNT_DISTINCT(`{column_name}`) as unique_count,
-            MIN(`{column_name}`) as min_value,
-            MAX(`{column_name}`) as max_value,
-            AVG(`{column_name}`) as avg_value,
-            STDDEV(`{column_name}`) as std_dev
-        FROM `{table_name}`
+            {select_list}
+        FROM {_q(table_name)}
         {where_clause}
         """
-        result = self.execute_query(query)
-        if result:
-            data = result[0]
-            stats = {
-                'total_count': data['total_count'],
-                'non_null_count': data['non_null_count'],
-                'null_count': data['total_count'] - data['non_null_count'],
-                'null_percentage': round((data['total_count'] - data['non_null_count']) * 100.0 / data['total_count'], 2) if data['total_count'] > 0 else 0,
+        row = self.execute_scalar_row(query, (*params, *where_params))
+        if not row:
+            return {}
+        
+        sampled_lengths = self._sample_lengths(table_name, long_columns, where_clause, where_params) if long_columns else {}
+        statistics = {}
+        for i, column in enumerate(columns):
+            if column in long_columns:
+                data = {key: row[f"c{i}_{key}"] for key in aggregates if key not in self.LENGTH_AGGREGATES and not (key == 'unique_count' and column['column_name'] in unique_columns)}
+                data.update(sampled_lengths.get(column['column_name'], dict.fromkeys(self.LENGTH_AGGREGATES)))
+            else:
+                data = {key: row[f"c{i}_{key}"] for key in aggregates if not (key == 'unique_count' and column['column_name'] in unique_columns)}
+            if column['column_name'] in unique_columns:
+                data['unique_count'] = data['non_null_count']
+            data.setdefault('unique_count', None)
+            data['total_count'] = row['total_count']
+            data['null_percentage'] = row[f"c{i}_null_percentage"]
+            statistics[column['column_name']] = self._build_column_statistics(kind, data, optimization_config)
+            if column in long_columns:
+                statistics[column['column_name']]['length_sample_rows'] = self.length_sample_rows
+        return statistics
+    
+    def _sample_lengths(self, table_name: str, columns: List[Dict], where_clause: str, where_params: tuple) -> Dict[str, Dict]:
+        """length stats of long text columns over the first length_sample_rows rows, return them by column name"""
+        projections = []
+        for i, column in enumerate(columns):
+            column_name = _q(column['column_name'])
+            projections.extend([
+                f"AVG(LENGTH({column_name})) as c{i}_avg_length",
+                f"MIN(LENGTH({column_name})) as c{i}_min_length",
+                f"MAX(LENGTH({column_name})) as c{i}_max_length"
+            ])
+        select_list = ',\n            '.join(projections)
+        query = f"""
+        SELECT 
+            {select_list}
+        FROM (
+            SELECT {', '.join(_q(column['column_name']) for column in columns)}
+            FROM {_q(table_name)}
+            {where_clause}
+            LIMIT %s
+        ) s
+        """
+        row = self.execute_scalar_row(query, (*where_params, self.length_sample_rows))
+        if not row:
+            return {}
+        return {
+            column['column_name']: {key: row[f"c{i}_{key}"] for key in self.LENGTH_AGGREGATES}
+            for i, column in enumerate(columns)
+        }
+    
+    def _build_column_statistics(self, kind: str, data: Dict, optimization_config: Dict = None) -> Dict:
+        """turn the fused aggregate values of one column into its statistics"""
+        stats = {
+            'total_count': data['total_count'],
+            'non_null_count': data['non_null_count'],
+            'null_count': data['total_count'] - data['non_null_count'],
+            # computed in SQL, except for the indexed string columns that only scan the non NULL rows
+            'null_percentage': float(data['null_percentage']) if 'null_percentage' in data
+                               else round((data['total_count'] - data['non_null_count']) * 100.0 / data['total_count'], 2) if data['total_count'] > 0 else 0
+        }
+        
+        if kind == 'numeric':
+            stats.update({
                 'unique_count': data['unique_count'],
-                'unique_percentage': round(data['unique_count'] * 100.0 / data['non_null_count'], 2) if data['non_null_count'] > 0 else 0,
+                'unique_percentage': round(data['unique_count'] * 100.0 / data['non_null_count'], 2) if data['non_null_count'] > 0 and data['unique_count'] is not None else 0,
                 'min_value': float(data['min_value']) if data['min_value'] is not None else None,
                 'max_value': float(data['max_value']) if data['max_value'] is not None else None,
                 'avg_value': round(float(data['avg_value']), 4) if data['avg_value'] is not None else None,
                 'std_dev': round(float(data['std_dev']), 4) if data['std_dev'] is not None else None
-            }
-            
-            # add optimization metadata if applied
-            if optimization_config:
-                stats['optimization_applied'] = {
-                    'sample_rate': optimization_config.get('sample_rate'),
-                    'time_range_days': optimization_config.get('time_range_days'),
-                    'method': 'sampling + time_range' if 'sample_rate' in optimization_config and 'time_range_days' in optimization_config else 'time_range' if 'time_range_days' in optimization_config else 'sampling'
-                }
-            
-            return stats
-        return {}
-    
-    def analyze_string_column(self, table_name: str, column_name: str, optimization_config: Dict = None) -> Dict:
-        """analyze string column statistics"""
-        where_clause = self._build_where_clause(table_name, optimization_config)
-        
-        # basic statistics
-        query = f"""
-        SELECT 
-            COUNT(*) as total_count,
-            COUNT(`{column_name}`) as non_null_count,
-            APPROX_COUNT_DISTINCT(`{column_name}`) as unique_count,
-            AVG(LENGTH(`{column_name}`)) as avg_length,
-            MIN(LENGTH(`{column_name}`)) as min_length,
-            MAX(LENGTH(`{column_name}`)) as max_length
-        FROM `{table_name}`
-        {where_clause}
-        """
-        result = self.execute_query(query)
-        
-        stats = {}
-        if result:
-            data = result[0]
-            total_rows = self.get_table_row_count(table_name, where_clause)
-            stats = {
-                'total_count': total_rows,
-                'non_null_count': data['non_null_count'],
-                'null_count': total_rows - data['non_null_count'],
-                'null_percentage': round((total_rows - data['non_null_count']) * 100.0 / total_rows, 2) if total_rows > 0 else 0,
+            })
+        elif kind == 'string':
+            stats.update({
                 'unique_count': data['unique_count'],
-                'unique_percentage': round(data['unique_count'] * 100.0 / data['non_null_count'], 2) if data['non_null_count'] > 0 else 0,
+                'unique_percentage': round(data['unique_count'] * 100.0 / data['non_null_count'], 2) if data['non_null_count'] > 0 and data['unique_count'] is not None else 0,
                 'avg_length': round(float(data['avg_length']), 2) if data['avg_length'] is not None else None,
-                'min_length': data['min_length'],
-                'max_length': data['max_length']
+                'min_length': int(data['min_length']) if data['min_length'] is not None else None,
+                'max_length': int(data['max_length']) if data['max_length'] is not None else None
+            })
+        elif kind == 'datetime':
+            stats.update({
+                'min_date': data['min_date'].isoformat() if data['min_date'] else None,
+                'max_date': data['max_date'].isoformat() if data['max_date'] else None
+            })
+            # calculate date range (unit: days)
+            if data['min_date'] and data['max_date']:
+                stats['date_range_days'] = (data['max_date'] - data['min_date']).days
+        elif kind == 'json':
+            stats['avg_length'] = round(float(data['avg_length']), 2) if data['avg_length'] is not None else None
+        
+        # add optimization metadata if applied
+        if optimization_config and kind != 'other':
+            stats['optimization_applied'] = {
+                'sample_rate': optimization_config.get('sample_rate'),
+                'time_range_days': optimization_config.get('time_range_days')
             }
-            
-            # add optimization metadata if applied
-            if optimization_config:
-                stats['optimization_applied'] = {
-                    'sample_rate': optimization_config.get('sample_rate'),
-                    'time_range_days': optimization_config.get('time_range_days')
-                } 
+            if kind == 'numeric':
+                stats['optimization_applied']['method'] = 'sampling + time_range' if 'sample_rate' in optimization_config and 'time_range_days' in optimization_config else 'time_range' if 'time_range_days' in optimization_config else 'sampling'
+        
+        return stats
+    
+    def analyze_column_distribution(self, table_name: str, column_info: Dict, stats: Dict, optimization_config: Dict = None, sample_key: str = None):
+        """add the value distribution of categorical string columns, it needs its own GROUP BY"""
+        column_name = column_info['column_name']
+        kind = self._column_kind(column_info['data_type'])
+        where_clause, where_params = self._build_where_clause(table_name, optimization_config)
         
         # if the unique value is less (probably a categorical column), get the distribution
-        if stats.get('unique_count', float('inf')) < 100 and stats.get('unique_count', 0) > 0:
+        unique_count = stats.get('unique_count')
+        if kind == 'string' and unique_count and unique_count < 100:
+            # on large tables that are not sampled yet, count the values on a primary key sample and scale the frequencies back
+            sample_modulus = 1
+            if (sample_key and not (optimization_config and 'sample_key' in optimization_config)
+                    and stats['total_count'] >= self.distribution_sample_min_rows):
+                sample_modulus = self.distribution_sample_modulus
+                sample_condition = f"MOD({_q(sample_key)}, %s) = 0"
+                where_clause = f"{where_clause} AND {sample_condition}" if where_clause else f"WHERE {sample_condition}"
+                where_params = (*where_params, sample_modulus)
+            
+            # the percentages are of all the (sampled) rows counted by this query, the NULL group is
+            # only dropped after the window has summed every group
             dist_query = f"""
             SELECT 
-                `{column_name}` as value,
-                COUNT(*) as frequency,
-                COUNT(*) * 100.0 / (SELECT COUNT(*) FROM `{table_name}`) as percentage
-            FROM `{table_name}`
-            {where_clause if where_clause else f"WHERE `{column_name}` IS NOT NULL"}
-            GROUP BY `{column_name}`
+                value,
+                frequency,
+                frequency * 100.0 / counted_rows as percentage
+            FROM (
+                SELECT 
+                    {_q(column_name)} as value,
+                    COUNT(*) as frequency,
+                    SUM(COUNT(*)) OVER () as counted_rows
+                FROM {_q(table_name)}
+                {where_clause}
+                GROUP BY {_q(column_name)}
+            ) grouped_values
+            WHERE value IS NOT NULL
             ORDER BY frequency DESC
             LIMIT 50
             """
-            distribution = self.execute_query(dist_query)
+            distribution = self.execute_query(dist_query, where_params)
+            value_type = column_info['data_type']  # do not save the actual value, only save the declared type
             stats['value_distribution'] = [
                 {
-                    'value_type': type(d['value']).__name__,  # do not save the actual value, only save the type
-                    'frequency': d['frequency'],
-                    'percentage': round(d['percentage'], 2)
+                    'value_type': value_type,
+                    'frequency': d['frequency'] * sample_modulus,
+                    'percentage': round(float(d['percentage']), 2)
                 }
                 for d in distribution
             ]
-        
-        return stats
+            if sample_modulus > 1:
+                stats['value_distribution_approximate'] = {'sample_key': sample_key, 'sample_modulus': sample_modulus}
     
-    def analyze_datetime_column(self, table_name: str, column_name: str, optimization_config: Dict = None) -> Dict:
-        """analyze datetime column statistics"""
-        where_clause = self._build_where_clause(table_name, optimization_config)
+    def analyze_indexed_string_column(self, table_name: str, column_info: Dict, optimization_config: Dict = None) -> Dict:
+        """analyze an indexed string column over its non NULL values only, so the column index can serve the length stats"""
+        column_name = column_info['column_name']
+        print(f"  - analyze indexed string column: {column_name}{self._optimization_info(optimization_config)}")
+        where_clause, where_params = self._build_where_clause(table_name, optimization_config)
         
+        projections = [
+            "COUNT(*) as non_null_count",
+            f"AVG(LENGTH({_q(column_name)})) as avg_length",
+            f"MIN(LENGTH({_q(column_name)})) as min_length",
+            f"MAX(LENGTH({_q(column_name)})) as max_length"
+        ]
+        params = []
+        unique_key = column_name in self.get_unique_key_columns(table_name)
+        if self.enable_distinct_counts and not unique_key:
+            expression, params = self._distinct_count_expression(table_name, column_name, where_clause, where_params)
+            projections.append(f"{expression} as unique_count")
+        select_list = ',\n            '.join(projections)
         query = f"""
         SELECT 
-            COUNT(*) as total_count,
-            COUNT(`{column_name}`) as non_null_count,
-            MIN(`{column_name}`) as min_date,
-            MAX(`{column_name}`) as max_date
-        FROM `{table_name}`
-        {where_clause}
+            {select_list}
+        FROM {_q(table_name)}
+        {self._where_not_null(where_clause, column_name)}
         """
-        result = self.execute_query(query)
-        
-        if result:
-            data = result[0]
-            stats = {
-                'total_count': data['total_count'],
-                'non_null_count': data['non_null_count'],
-                'null_count': data['total_count'] - data['non_null_count'],
-                'null_percentage': round((data['total_count'] - data['non_null_count']) * 100.0 / data['total_count'], 2) if data['total_count'] > 0 else 0,
-                'min_date': data['min_date'].isoformat() if data['min_date'] else None,
-                'max_date': data['max_date'].isoformat() if data['max_date'] else None
-            }
-            
-            # calculate date range (unit: days)
-            if data['min_date'] and data['max_date']:
-                date_range = (data['max_date'] - data['min_date']).days
-                stats['date_range_days'] = date_range
-            
-            dist_query = f"""
-            SELECT 
-                YEAR(`{column_name}`) as year,
-                MONTH(`{column_name}`) as month,
-                COUNT(*) as count
-            FROM `{table_name}`
-            {where_clause if where_clause else f"WHERE `{column_name}` IS NOT NULL"}
-            GROUP BY YEAR(`{column_name}`), MONTH(`{column_name}`)
-            ORDER BY year DESC, month DESC
-            LIMIT 24
-            """
-            time_dist = self.execute_query(dist_query)
-            stats['monthly_distribution'] = [
-                {'year': d['year'], 'month': d['month'], 'count': d['count']}
-                for d in time_dist
-            ]
-            
-            # add optimization metadata if applied
-            if optimization_config:
-                stats['optimization_applied'] = {
-                    'sample_rate': optimization_config.get('sample_rate'),
-                    'time_range_days': optimization_config.get('time_range_days')
-                }
-            
-            return stats
-        return {}
+        data = self.execute_scalar_row(query, (*params, *where_params))
+        if not data:
+            return {}
+        
+        if unique_key:
+            data['unique_count'] = data['non_null_count']
+        data.setdefault('unique_count', None)
+        # the NULL rows are not scanned, the null count comes from the table row count
+        data['total_count'] = self.get_table_row_count(table_name, where_clause, where_params)
+        return self._build_column_statistics('string', data, optimization_config)
     
-    def analyze_json_column(self, table_name: str, column_name: str, optimization_config: Dict = None) -> Dict:
-        """analyze json column statistics"""
-        where_clause = self._build_where_clause(table_name, optimization_config)
+    def analyze_datetime_column(self, table_name: str, column_info: Dict, optimization_config: Dict = None) -> Dict:
+        """analyze a datetime column with one ROLLUP query, the month rows are the distribution and the grand total row the base stats"""
+        column_name = column_info['column_name']
+        print(f"  - analyze datetime column: {column_name}{self._optimization_info(optimization_config)}")
+        where_clause, where_params = self._build_where_clause(table_name, optimization_config)
         
         query = f"""
         SELECT 
+            YEAR({_q(column_name)}) as year,
+            MONTH({_q(column_name)}) as month,
             COUNT(*) as total_count,
-            COUNT(`{column_name}`) as non_null_count,
-            AVG(LENGTH(`{column_name}`)) as avg_length
-        FROM `{table_name}`
+            COUNT({_q(column_name)}) as non_null_count,
+            {self.NULL_PERCENTAGE.format(column=_q(column_name))} as null_percentage,
+            MIN({_q(column_name)}) as min_date,
+            MAX({_q(column_name)}) as max_date
+        FROM {_q(table_name)}
         {where_clause}
+        GROUP BY YEAR({_q(column_name)}), MONTH({_q(column_name)}) WITH ROLLUP
         """
-        result = self.execute_query(query)
-        
-        if result:
-            data = result[0]
-            stats = {
-                'total_count': data['total_count'],
-                'non_null_count': data['non_null_count'],
-                'null_count': data['total_count'] - data['non_null_count'],
-                'null_percentage': round((data['total_count'] - data['non_null_count']) * 100.0 / data['total_count'], 2) if data['total_count'] > 0 else 0,
-                'avg_length': round(float(data['avg_length']), 2) if data['avg_length'] is not None else None
-            }
-            
-            # add optimization metadata if applied
-            if optimization_config:
-                stats['optimization_applied'] = {
-                    'sample_rate': optimization_config.get('sample_rate'),
-                    'time_range_days': optimization_config.get('time_range_days')
-                } 
-            
-            return stats
-        return {}
-    
-    def analyze_column(self, table_name: str, column_info: Dict, optimization_config: Dict = None) -> Dict:
-        """analyze column by data type"""
-        column_name = column_info['column_name']
-        data_type = column_info['data_type'].lower()
+        rows = self.execute_query(query, where_params)
         
-        opt_info = ""
-        if optimization_config:
-            opt_info = f" [optimized: {optimization_config.get('sample_rate', 0)*100:.1f}% sample, {optimization_config.get('time_range_days', 'N/A')} days]"
-        print(f"  - analyze column: {column_name} ({data_type}){opt_info}")
+        # the grand total and the group of NULL dates both have NULL year and month, the grand total is the larger one
+        totals = [row for row in rows if row['year'] is None and row['month'] is None]
+        if not totals:
+            return {}
+        stats = self._build_column_statistics('datetime', max(totals, key=lambda row: row['total_count']), optimization_config)
         
-        if data_type in ['int', 'bigint', 'tinyint', 'smallint', 'mediumint', 'decimal', 'float', 'double']:
-            return self.analyze_numeric_column(table_name, column_name, optimization_config)
-        elif data_type in ['varchar', 'char', 'text', 'mediumtext', 'longtext']:
-            return self.analyze_string_column(table_name, column_name, optimization_config)
-        elif data_type in ['datetime', 'date', 'timestamp']:
-            return self.analyze_datetime_column(table_name, column_name, optimization_config)
-        elif data_type == 'json':
-            return self.analyze_json_column(table_name, column_name, optimization_config)
-        elif data_type == 'boolean':
-            # Boolean column can be treated as a categorical column
-            return self.analyze_string_column(table_name, column_name, optimization_config)
-        else:
-            where_clause = self._build_where_clause(table_name, optimization_config)
-            # other types only get basic statistics
-            query = f"""
-            SELECT 
-                COUNT(*) as total_count,
-                COUNT(`{column_name}`) as non_null_count
-            FROM `{table_name}`
-            {where_clause if where_clause else f"WHERE `{column_name}` IS NOT NULL"}
-            """
-            result = self.execute_query(query)
-            if result:
-                data = result[0]
-                return {
-                    'total_count': data['total_count'],
-                    'non_null_count': data['non_null_count'],
-                    'null_count': data['total_count'] - data['non_null_count'],
-                    'null_percentage': round((data['total_count'] - data['non_null_count']) * 100.0 / data['total_count'], 2) if data['total_count'] > 0 else 0
-                }
-        return {}
+        months = sorted(
+            (row for row in rows if row['year'] is not None and row['month'] is not None),
+            key=lambda row: (row['year'], row['month']),
+            reverse=True
+        )[:24]
+        stats['monthly_distribution'] = [
+            {'year': int(d['year']), 'month': int(d['month']), 'count': d['total_count']}
+            for d in months
+        ]
+        return stats
     
     def analyze_table(self, table_name: str):
         """analyze all features of a single table"""
@@ -414,59 +655,162 @@ class ProductionDataProfiler:
         columns_to_analyze = columns_to_analyze[:self.max_columns_to_analyze]
         
         # initialize table results
-        self.results['tables'][table_name] = {
+        table_results = {
             'column_count': len(columns),
             'columns': {},
             'is_large_table': is_large_table
         }
         
         if optimization_config:
-            self.results['tables'][table_name]['optimization_applied'] = {
+            table_results['optimization_applied'] = {
                 'sample_rate': optimization_config.get('sample_rate'),
+                'sample_key': optimization_config.get('sample_key'),
+                'sample_modulus': optimization_config.get('sample_modulus'),
                 'time_range_days': optimization_config.get('time_range_days'),
                 'key_columns_only': 'key_columns' in optimization_config
             }
         
-        # analyze each column
-        print(f"\nanalyze column statistics ({len(columns_to_analyze)} columns):")
+        # a single numeric primary key column can be used to sample the value distributions
+        primary_keys = [column for column in columns if column['column_key'] == 'PRI']
+        sample_key = None
+        if len(primary_keys) == 1 and self._column_kind(primary_keys[0]['data_type']) == 'numeric':
+            sample_key = primary_keys[0]['column_name']
+        
+        # one fused aggregate query (one table scan) per column kind, instead of one scan per column,
+        # datetime columns get their stats from their own monthly ROLLUP query instead,
+        # indexed string columns get their own NOT NULL query that the column index can serve
+        column_groups = {}
+        single_columns = []
         for column in columns_to_analyze:
-            column_name = column['column_name']
-            column_stats = {
+            kind = self._column_kind(column['data_type'])
+            if kind == 'datetime':
+                single_columns.append((column, self.analyze_datetime_column))
+            elif self._is_indexed_string_column(column):
+                single_columns.append((column, self.analyze_indexed_string_column))
+            else:
+                column_groups.setdefault(kind, []).append(column)
+        
+        print(f"\nanalyze column statistics ({len(columns_to_analyze)} columns in {len(column_groups) + len(single_columns)} queries):")
+        statistics = {}
+        with ThreadPoolExecutor(max_workers=self.pool_size) as executor:
+            group_futures = [
+                executor.submit(self.analyze_column_group, table_name, kind, columns, optimization_config)
+                for kind, columns in column_groups.items()
+            ]
+            single_column_futures = {
+                column['column_name']: executor.submit(analyze, table_name, column, optimization_config)
+                for column, analyze in single_columns
+            }
+            for future in group_futures:
+                statistics.update(future.result())
+            for column_name, future in single_column_futures.items():
+                statistics[column_name] = future.result()
+            
+            # the value distributions group by a single column, they still run per column,
+            # unique key columns have no repeated values to count
+            unique_columns = self.get_unique_key_columns(table_name)
+            list(executor.map(
+                lambda column: self.analyze_column_distribution(table_name, column, statistics.setdefault(column['column_name'], {}), optimization_config, sample_key),
+                [column for column in columns_to_analyze if column['column_name'] not in unique_columns]
+            ))
+        
+        for column in columns_to_analyze:
+            table_results['columns'][column['column_name']] = {
                 'data_type': column['data_type'],
                 'is_nullable': column['is_nullable'],
                 'column_key': column['column_key'],
-                'statistics': self.analyze_column(table_name, column, optimization_config)
+                'statistics': statistics.get(column['column_name'], {})
             }
-            self.results['tables'][table_name]['columns'][column_name] = column_stats
+        
+        with self._results_lock:
+            self.results['tables'][table_name] = table_results
+            self._write_ready_tables()
         
     def analyze_all_tables(self):
-        """analyze all core tables"""
+        """analyze all core tables concurrently"""
         print(f"\nanalyze {len(self.core_tables)} core tables...")
+        self.preload_table_columns(self.core_tables)
+        # only the indexed string columns read the unfiltered row count, the large tables are only counted with their filter
+        self.preload_table_row_counts([
+            table_name for table_name in self.core_tables
+            if table_name not in self.large_table_configs
+            and any(self._is_indexed_string_column(column) for column in self.get_table_columns(table_name)[:self.max_columns_to_analyze])
+        ])
+        
+        with ThreadPoolExecutor(max_workers=self.pool_size) as executor:
+            futures = {executor.submit(self.analyze_table, table_name): table_name for table_name in self.core_tables}
+            for future in as_completed(futures):
+                try:
+                    future.result()
+                except Exception as e:
+                    print(f"✗ analyze table {futures[future]} failed: {e}, {traceback.format_exc()}")
+                    with self._results_lock:
+                        self._failed_tables.add(futures[future])
+                        self._write_ready_tables()
         
-        for table_name in self.core_tables:
-            try:
-                self.analyze_table(table_name)
-            except Exception as e:
-                print(f"✗ analyze table {table_name} failed: {e}, {traceback.format_exc()}")
-                continue
+        # keep the in-memory results in core_tables order as well, _write_ready_tables writes the file in that order
+        self.results['tables'] = {
+            table_name: self.results['tables'][table_name]
+            for table_name in self.core_tables if table_name in self.results['tables']
+        }
         
+    def open_output(self, output_file: str = 'production_data_profile.json'):
+        """start the results file next to the output file, each table is appended to it as soon as it and the tables before it are analyzed"""
+        output_path = os.path.join(os.path.dirname(__file__), output_file)
+        self._output = open(output_path + '.tmp', 'wb')
+        self._output.write(b'{\n"metadata": ' + _dumps(self.results['metadata'], self.pretty_json) + b',\n"tables": {')
+        self._tables_written = 0
+        self._output_index = 0
+        self._failed_tables.clear()
+    
+    def _write_ready_tables(self):
+        """append the analyzed tables to the results file in core_tables order, caller must hold the results lock"""
+        if not self._output:
+            return
+        while self._output_index < len(self.core_tables):
+            table_name = self.core_tables[self._output_index]
+            if table_name in self.results['tables']:
+                separator = b',\n' if self._tables_written else b'\n'
+                self._output.write(separator + _dumps(table_name) + b': ' + _dumps(self.results['tables'][table_name], self.pretty_json))
+                self._tables_written += 1
+            elif table_name not in self._failed_tables:
+                break  # still running, the tables after it wait
+            self._output_index += 1
+        self._output.flush()
+    
+    def _discard_output(self):
+        """close and remove an unfinished results file, an earlier complete results file is left as it is"""
+        if self._output:
+            self._output.close()
+            os.remove(self._output.name)
+            self._output = None
+    
     def save_results(self, output_file: str = 'production_data_profile.json'):
-        """save analysis results to JSON file"""
+        """save analysis results to JSON file, finishes the streamed file when open_output was called"""
         output_path = os.path.join(os.path.dirname(__file__), output_file)
-        with open(output_path, 'w', encoding='utf-8') as f:
-            json.dump(self.results, f, indent=2, ensure_ascii=False, cls=DecimalEncoder)
+        if self._output:
+            self._output.write(b'\n}\n}\n')
+            self._output.close()
+            os.replace(self._output.name, output_path)
+            self._output = None
+        else:
+            with open(output_path, 'wb') as f:
+                f.write(_dumps(self.results, self.pretty_json))
         print(f"\n✓ analysis results saved to: {output_path}")
     
     def run(self, output_file: str = 'production_data_profile.json'):
         """execute complete analysis process"""
         try:
+            self._rowcount_cache.clear()
             self.connect()
+            self.open_output(output_file)
             self.analyze_all_tables()
             self.save_results(output_file)
         except Exception as e:
             print(f"\n✗ analyze process failed: {e}")
             raise
         finally:
+            self._discard_output()
             self.close()
 
 
@@ -479,8 +823,15 @@ def main():
         'user': os.getenv('DB_USER', 'root'),
         'password': os.getenv('DB_PASSWORD', ''),
         'database': os.getenv('DB_NAME', 'tenant'),
+        'pool_size': int(os.getenv('POOL_SIZE', '5')),  # concurrent queries / connections
+        'pool_recycle_seconds': int(os.getenv('POOL_RECYCLE_SECONDS', '3600')),  # reopen connections older than this, keep it below wait_timeout
+        'enable_distinct_counts': os.getenv('ENABLE_DISTINCT_COUNTS', 'true').lower() == 'true',  # unique counts, can be slow without APPROX_COUNT_DISTINCT
         # analyze options
         'max_columns_to_analyze': int(os.getenv('MAX_COLUMNS_TO_ANALYZE', '50')),
+        'pretty_json': os.getenv('PRETTY_JSON', 'false').lower() == 'true',  # indented results file, compact by default
+        'length_sample_rows': int(os.getenv('LENGTH_SAMPLE_ROWS', '100000')),  # rows read for mediumtext / longtext / json length stats
+        'distribution_sample_min_rows': int(os.getenv('DISTRIBUTION_SAMPLE_MIN_ROWS', '1000000')),  # sample the value distributions from this table size
+        'distribution_sample_modulus': int(os.getenv('DISTRIBUTION_SAMPLE_MODULUS', '100')),  # keep rows with MOD(primary key, modulus) = 0
         # large table optimization options
         'activity_sample_rate': float(os.getenv('ACTIVITY_SAMPLE_RATE', '0.01')),  # 1%，sample rate
         'activity_time_range_days': int(os.getenv('ACTIVITY_TIME_RANGE_DAYS', '90'))  # 90 days，time range
@@ -494,6 +845,8 @@ def main():
     print(f"  - database: {config['database']}")
     print(f"  - host: {config['host']}:{config['port']}")
     print(f"  - max columns to analyze: {config['max_columns_to_analyze']}")
+    print(f"  - connection pool size: {config['pool_size']}")
+    print(f"  - distinct counts: {config['enable_distinct_counts']}")
     print(f"\nlarge table optimization:")
     print(f"  - activity sample rate: {config['activity_sample_rate']*100:.1f}%")
     print(f"  - activity time range: {config['activity_time_range_days']} days")
@@ -3,44 +3,93 @@
 Sample Account Analyzer - analyze the relationship of specified accounts
 """
 
+import hashlib
 import json
 import os
-from decimal import Decimal
+import queue
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime, timedelta
 import traceback
-from typing import Dict, List, Any
+from typing import Dict, List, Any, Optional, Tuple
 import pymysql
+from pymysql.constants import CLIENT
 from pymysql.cursors import DictCursor
 
+try:
+    import orjson
+except ImportError:  # optional, fall back to the stdlib json encoder
+    orjson = None
 
-class DecimalEncoder(json.JSONEncoder):
-    """custom json encoder"""
-    def default(self, obj):
-        if isinstance(obj, Decimal):
-            return float(obj)
-        return super(DecimalEncoder, self).default(obj)
+
+def _dumps(value, pretty: bool = False) -> bytes:
+    """serialize results to JSON, indented when pretty, Decimal values from the database become floats"""
+    if orjson:
+        return orjson.dumps(value, default=float, option=orjson.OPT_INDENT_2 if pretty else None)
+    if pretty:
+        return json.dumps(value, indent=2, ensure_ascii=False, default=float).encode('utf-8')
+    return json.dumps(value, separators=(',', ':'), ensure_ascii=False, default=float).encode('utf-8')
 
 
 class SampleAccountAnalyzer:
     """sample account relationship analyzer"""
     
+    # rounds of random id probes before giving up on a sparse id range
+    SAMPLE_PROBE_ROUNDS = 5
+    MAX_PROBES_PER_ROUND = 10000
+    KEYSET_STARTS_PER_ROUND = 10  # random starts of the bounded id runs that top up a sample the seek probes could not fill
+    PROBE_CHUNK_SIZE = 1000  # ids per probe IN (...) list, a round is sent as one batch of these statements
+    # session temporary table holding the sample account IDs, the analyses join it instead of inlining an IN (...) list
+    SAMPLE_TABLE = '_sample_acct'
+    INSERT_BATCH_SIZE = 10000  # ids per INSERT statement, keeps each statement well below max_allowed_packet
+    # session temporary table holding the sampled recent activities of the sample accounts, shared by the activity analyses
+    ACTIVITY_TABLE = '_sample_activity'
+    # bucket ranges of the per key counts and their labels, built once and shared by the bucket query and the bucket list
+    ACCOUNT_PERSON_RANGES = [(0, 0), (1, 5), (6, 10), (11, 20), (21, 50), (51, 100), (101, 500), (501, float('inf'))]
+    ACCOUNT_PERSON_LABELS = ['0', '1-5', '6-10', '11-20', '21-50', '51-100', '101-500', '500+']
+    ACCOUNT_ACTIVITY_RANGES = [(0, 0), (1, 10), (11, 50), (51, 100), (101, 500), (501, 1000), (1001, 5000), (5001, float('inf'))]
+    ACCOUNT_ACTIVITY_LABELS = ['0', '1-10', '11-50', '51-100', '101-500', '501-1000', '1001-5000', '5000+']
+    PERSON_ACTIVITY_RANGES = [(0, 0), (1, 10), (11, 50), (51, 100), (101, 500), (501, 1000), (1001, float('inf'))]
+    PERSON_ACTIVITY_LABELS = ['0', '1-10', '11-50', '51-100', '101-500', '501-1000', '1000+']
+    # larger samples list only their first and last IDs in the results metadata
+    MAX_LISTED_ACCOUNT_IDS = 50
+    LISTED_ACCOUNT_IDS_EDGE = 10
+    # config that determines the results, a cached run is only reused when all of them match
+    CACHE_KEY_FIELDS = ('host', 'port', 'database', 'sample_size', 'activity_time_range_days', 'activity_sample_rate', 'account_ids')
+    
     def __init__(self, config: Dict[str, Any]):
         """
         initialize analyzer
         :param config: database connection configuration
         """
         self.config = config
-        self.connection = None
+        self.pool = None
+        self.pool_size = config.get('pool_size', 5)  # concurrent queries / connections, the analyses run in parallel on them
         self.sample_size = config.get('sample_size', 50)  # default 50 accounts
         self.activity_time_range_days = config.get('activity_time_range_days', 90)
+        # a constant cutoff instead of DATE_SUB(NOW(), ...) lets the planner use a range scan on activity_date
+        self.activity_cutoff = (datetime.now() - timedelta(days=self.activity_time_range_days)).strftime('%Y-%m-%d %H:%M:%S')
         self.activity_sample_rate = config.get('activity_sample_rate', 0.01)  # default 1% sampling for activity queries
-        self.account_ids = config.get('account_ids', [])  # optional: specify specific account IDs, leave blank for random sampling
+        if not 0 < self.activity_sample_rate <= 1:
+            raise ValueError(f"activity_sample_rate must be in (0, 1], got {self.activity_sample_rate}")
+        self.activity_sample_modulus = max(1, round(1 / self.activity_sample_rate))  # keep activities with MOD(id, modulus) = 0
+        if abs(1 / self.activity_sample_modulus - self.activity_sample_rate) > self.activity_sample_rate * 0.05:
+            print(f"⚠️  activity sample rate {self.activity_sample_rate} is applied as 1/{self.activity_sample_modulus} ({100 / self.activity_sample_modulus:.1f}%)")
+        # optional: specify specific account IDs, leave blank for random sampling, repeated IDs are counted once
+        self.account_ids = list(dict.fromkeys(int(account_id) for account_id in config.get('account_ids', [])))
+        self.cache_ttl_seconds = config.get('cache_ttl_seconds', 0)  # reuse the results of a run with the same config this long, 0 disables the cache
+        self.cache_dir = config.get('cache_dir', os.path.join(os.path.expanduser('~'), '.cache', 'sample_account_analyzer'))
         
         self.results = {
             'metadata': {
                 'database': config.get('database', 'unknown'),
                 'sample_size': self.sample_size,
                 'activity_time_range_days': self.activity_time_range_days,
+                'activity_cutoff': self.activity_cutoff,
                 'activity_sample_rate': self.activity_sample_rate,
+                'activity_sample_modulus': self.activity_sample_modulus,
                 'sampling_method': 'specified_ids' if self.account_ids else 'random_sample'
             },
             'sample_account_stats': {},
@@ -48,36 +97,155 @@ class SampleAccountAnalyzer:
         }
     
     def connect(self):
-        """connect to database"""
+        """open a pool of database connections, the analyses run concurrently on them"""
         try:
-            self.connection = pymysql.connect(
-                host=self.config['host'],
-                port=self.config.get('port', 3306),
-                user=self.config['user'],
-                password=self.config['password'],
-                database=self.config['database'],
-                cursorclass=DictCursor
-            )
-            print(f"✓ connect to database: {self.config['database']}")
+            self.pool = queue.Queue()
+            for _ in range(self.pool_size):
+                self.pool.put(pymysql.connect(
+                    host=self.config['host'],
+                    port=self.config.get('port', 3306),
+                    user=self.config['user'],
+                    password=self.config['password'],
+                    database=self.config['database'],
+                    cursorclass=DictCursor,
+                    client_flag=CLIENT.MULTI_STATEMENTS  # the activity analyses are sent as one batch
+                ))
+            print(f"✓ connect to database: {self.config['database']} ({self.pool_size} connections)")
         except Exception as e:
             print(f"✗ connect to database failed: {e}")
+            self.close()
             raise
     
     def close(self):
-        """close database connection"""
-        if self.connection:
-            self.connection.close()
+        """close all pooled database connections"""
+        if self.pool:
+            while not self.pool.empty():
+                self.pool.get_nowait().close()
     
-    def execute_query(self, query: str) -> List[Dict]:
-        """execute SQL query"""
+    @contextmanager
+    def get_connection(self):
+        """borrow a connection from the pool and give it back when done"""
+        connection = self.pool.get()
         try:
-            with self.connection.cursor() as cursor:
-                cursor.execute(query)
+            yield connection
+        finally:
+            self.pool.put(connection)
+    
+    def create_sample_table(self, account_ids: List[int]):
+        """load the sample account IDs into a temporary table on every pooled connection, temporary tables are per session"""
+        # build the INSERT statements once for all connections, the ids are unique ints so they are formatted instead of escaped per connection
+        inserts = [
+            f"INSERT INTO {self.SAMPLE_TABLE} (id) VALUES " + ','.join(f"({account_id})" for account_id in account_ids[i:i + self.INSERT_BATCH_SIZE])
+            for i in range(0, len(account_ids), self.INSERT_BATCH_SIZE)
+        ]
+        connections = [self.pool.get() for _ in range(self.pool_size)]
+        try:
+            for connection in connections:
+                with connection.cursor() as cursor:
+                    cursor.execute(f"DROP TEMPORARY TABLE IF EXISTS {self.SAMPLE_TABLE}")
+                    cursor.execute(f"CREATE TEMPORARY TABLE {self.SAMPLE_TABLE} (id BIGINT PRIMARY KEY)")
+                    for insert in inserts:
+                        cursor.execute(insert)
+        finally:
+            for connection in connections:
+                self.pool.put(connection)
+    
+    def execute_query(self, query: str, params: tuple = None, connection=None) -> Optional[List[Dict]]:
+        """execute SQL query on the given connection, or on a pooled one, None when it failed"""
+        if connection is None:
+            with self.get_connection() as connection:
+                return self.execute_query(query, params, connection)
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute(query, params)
                 return cursor.fetchall()
         except Exception as e:
             print(f"✗ execute query failed: {e}")
             print(f"SQL: {query[:200]}...")
-            return []
+            return None
+    
+    def execute_many_queries(self, queries: List[str], params: tuple = None, connection=None) -> List[Optional[List[Dict]]]:
+        """send several statements in one round trip and return one row list per statement (None for the failed ones), params are bound in statement order"""
+        if connection is None:
+            with self.get_connection() as connection:
+                return self.execute_many_queries(queries, params, connection)
+        batch = ';\n'.join(query.strip().rstrip(';') for query in queries)
+        result_sets = []
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute(batch, params)
+                result_sets.append(cursor.fetchall())
+                while cursor.nextset():
+                    result_sets.append(cursor.fetchall())
+        except Exception as e:
+            print(f"✗ execute query failed: {e}")
+            print(f"SQL: {batch[:200]}...")
+        # pad so callers can always index one entry per statement, statements that did not run are failed
+        return result_sets + [None] * (len(queries) - len(result_sets))
+    
+    def _activity_sample_clause(self) -> Tuple[str, tuple]:
+        """AND condition and parameters sampling the activity rows, a modulo on the primary key needs no random number per row"""
+        if self.activity_sample_modulus <= 1:
+            return "", ()
+        return "AND MOD(activity.id, %s) = 0", (self.activity_sample_modulus,)
+    
+    def analyze_sampled_activity(self, account_ids: List[int]) -> Dict[str, Optional[Dict]]:
+        """
+        materialize the sampled recent activities of the sample accounts once and run the three activity analyses against it,
+        all in one multi-statement round trip on one connection (temporary tables are per session), return their stats by result name
+        """
+        sample_clause, sample_params = self._activity_sample_clause()
+        drop_query = f"DROP TEMPORARY TABLE IF EXISTS {self.ACTIVITY_TABLE}"
+        queries = [
+            drop_query,
+            f"""
+            CREATE TEMPORARY TABLE {self.ACTIVITY_TABLE} AS
+            SELECT activity.id, activity.account_id, activity.person_id, activity.activityType
+            FROM activity
+            JOIN {self.SAMPLE_TABLE} sample_ids ON activity.account_id = sample_ids.id
+            WHERE activity.activity_date >= %s
+              {sample_clause}
+            """,
+            # sampled activities per sample account scaled back, the LEFT JOIN keeps the accounts with 0 activities
+            self._count_statistics_query(f"""
+            SELECT 
+                sample_ids.id as account_id,
+                COUNT(sampled.id) * %s as cnt
+            FROM {self.SAMPLE_TABLE} sample_ids
+            LEFT JOIN {self.ACTIVITY_TABLE} sampled ON sampled.account_id = sample_ids.id
+            GROUP BY sample_ids.id
+            """, self.ACCOUNT_ACTIVITY_RANGES),
+            # sampled activities of every person in the sample accounts, the LEFT JOIN keeps the persons without activities
+            self._count_statistics_query(f"""
+            SELECT 
+                person_norm.id as person_id,
+                COUNT(sampled.id) * %s as cnt
+            FROM person_norm
+            JOIN {self.SAMPLE_TABLE} sample_ids ON person_norm.account_id = sample_ids.id
+            LEFT JOIN {self.ACTIVITY_TABLE} sampled ON sampled.person_id = person_norm.id
+            GROUP BY person_norm.id
+            """, self.PERSON_ACTIVITY_RANGES),
+            f"""
+            SELECT 
+                activityType,
+                COUNT(*) as count,
+                -- window function, needs MySQL 8.0+ or Doris (see config.env.template)
+                CAST(ROUND(COUNT(*) * 100.0 / SUM(COUNT(*)) OVER (), 2) AS DOUBLE) as percentage
+            FROM {self.ACTIVITY_TABLE}
+            WHERE activityType IS NOT NULL
+            GROUP BY activityType
+            ORDER BY count DESC
+            LIMIT 20
+            """,
+            drop_query
+        ]
+        params = (self.activity_cutoff, *sample_params, self.activity_sample_modulus, self.activity_sample_modulus)
+        _, _, account_rows, person_rows, type_rows, _ = self.execute_many_queries(queries, params)
+        return {
+            'account_activity': self.analyze_account_activity_counts(account_ids, account_rows),
+            'person_activity': self.analyze_person_activity_counts(account_ids, person_rows),
+            'activity_types': self.analyze_activity_types(account_ids, type_rows)
+        }
     
     def get_sample_account_ids(self) -> List[int]:
         """
@@ -91,78 +259,124 @@ class SampleAccountAnalyzer:
         
         print(f"random sample {self.sample_size} accounts from account_base table")
         
-        # 先估算总行数，计算采样概率
-        count_query = "SELECT COUNT(*) as total FROM account_base"
-        count_result = self.execute_query(count_query)
-        total_accounts = count_result[0]['total'] if count_result else 0
-        
-        if total_accounts == 0:
+        # probe random ids between MIN(id) and MAX(id) with primary key lookups instead of a RAND() per row full scan
+        # the row estimate comes from the table statistics, no COUNT(*) scan is needed
+        range_result = self.execute_query("""
+        SELECT 
+            MIN(id) as min_id,
+            MAX(id) as max_id,
+            (SELECT TABLE_ROWS FROM information_schema.TABLES
+             WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'account_base') as estimated_rows
+        FROM account_base
+        """)
+        if not range_result or range_result[0]['min_id'] is None:
             print("⚠️  account_base表为空")
             return []
+        min_id, max_id = range_result[0]['min_id'], range_result[0]['max_id']
+        estimated_rows = int(range_result[0]['estimated_rows'] or 0)
+        print(f"  ✓ id range: {min_id:,} - {max_id:,}, ~{estimated_rows:,} rows")
+        
+        account_ids = []
+        found = set()
+        # probe more ids than needed, gaps in the id range miss, the estimated id density sizes the first round
+        scale_factor = 1.5
+        if estimated_rows > 0:
+            scale_factor = max(scale_factor, 1.5 * (max_id - min_id + 1) / estimated_rows)
+        for _ in range(self.SAMPLE_PROBE_ROUNDS):
+            missing = self.sample_size - len(account_ids)
+            probe_count = min(int(missing * scale_factor) + 1, max_id - min_id + 1, self.MAX_PROBES_PER_ROUND)
+            probes = list({random.randint(min_id, max_id) for _ in range(probe_count)} - found)
+            if probes:
+                # short IN lists keep every statement well inside the range optimizer memory limit
+                queries = [
+                    f"SELECT id FROM account_base WHERE id IN ({', '.join(['%s'] * len(probes[i:i + self.PROBE_CHUNK_SIZE]))})"
+                    for i in range(0, len(probes), self.PROBE_CHUNK_SIZE)
+                ]
+                result_sets = self.execute_many_queries(queries, tuple(probes))
+                hits = [row['id'] for rows in result_sets for row in rows or []]
+                random.shuffle(hits)
+                for account_id in hits[:missing]:
+                    found.add(account_id)
+                    account_ids.append(account_id)
+                # scale the next round by the observed hit rate
+                scale_factor = max(scale_factor, len(probes) / max(len(hits), 1) * 1.5)
+            if len(account_ids) >= self.sample_size or len(found) == max_id - min_id + 1:
+                break
+        
+        if len(account_ids) < self.sample_size and len(found) < max_id - min_id + 1:
+            # sparse id ranges (snowflake / stepped ids) miss most exact probes, seek to the next existing id instead
+            print(f"⚠️  only {len(account_ids)} of {self.sample_size} accounts found after {self.SAMPLE_PROBE_ROUNDS} probe rounds, seek the next ids instead")
+            for _ in range(self.SAMPLE_PROBE_ROUNDS):
+                missing = self.sample_size - len(account_ids)
+                probes = [random.randint(min_id, max_id) for _ in range(min(missing * 2, self.MAX_PROBES_PER_ROUND))]
+                for i in range(0, len(probes), self.PROBE_CHUNK_SIZE):
+                    chunk = probes[i:i + self.PROBE_CHUNK_SIZE]
+                    queries = ["SELECT id FROM account_base WHERE id >= %s ORDER BY id LIMIT 1"] * len(chunk)
+                    for rows in self.execute_many_queries(queries, tuple(chunk)):
+                        for row in rows or []:
+                            if row['id'] not in found and len(account_ids) < self.sample_size:
+                                found.add(row['id'])
+                                account_ids.append(row['id'])
+                if len(account_ids) >= self.sample_size:
+                    break
         
-        # 计算采样概率（略高于目标，确保足够样本）
-        sample_probability = self.sample_size / total_accounts
-        
-        print(f"  ✓ 总账户数: {total_accounts:,}, 采样概率: {sample_probability:.6f}")
-        
-        query = f"""
-        SELECT id 
-        FROM account_base 
-        WHERE RAND() < {sample_probability}
-        LIMIT {self.sample_size}
-        """
-        result = self.execute_query(query)
-        account_ids = [row['id'] for row in result]
-        
+        for probe_round in range(self.SAMPLE_PROBE_ROUNDS):
+            if len(account_ids) >= self.sample_size:
+                break
+            # fewer distinct seek targets than missing accounts (clustered ids), top the sample up with bounded id runs
+            # from random starts, the last round also starts at MIN(id) so every id of a small table is reachable
+            missing = self.sample_size - len(account_ids)
+            starts = [random.randint(min_id, max_id) for _ in range(self.KEYSET_STARTS_PER_ROUND)]
+            if probe_round == self.SAMPLE_PROBE_ROUNDS - 1:
+                starts.append(min_id)
+            limit = min(missing, self.MAX_PROBES_PER_ROUND)
+            queries = ["SELECT id FROM account_base WHERE id >= %s ORDER BY id LIMIT %s"] * len(starts)
+            hits = [row['id'] for rows in self.execute_many_queries(queries, tuple(v for start in starts for v in (start, limit))) for row in rows or []]
+            new_ids = list({account_id for account_id in hits if account_id not in found})
+            random.shuffle(new_ids)
+            for account_id in new_ids[:missing]:
+                found.add(account_id)
+                account_ids.append(account_id)
+        
+        if len(account_ids) < self.sample_size:
+            print(f"⚠️  only {len(account_ids)} of {self.sample_size} accounts found, account_base has fewer reachable ids than the sample size")
         print(f"✓ get {len(account_ids)} sample account IDs")
         return account_ids
     
-    def analyze_account_person_counts(self, account_ids: List[int]) -> Dict:
+    def analyze_account_person_counts(self, account_ids: List[int]) -> Optional[Dict]:
         """
         analyze the number of persons in specified accounts
         """
         print(f"\nanalyze {len(account_ids)} accounts' person relationship...")
         
-        ids_str = ','.join(str(id) for id in account_ids)
-        
+        # persons per sample account, the LEFT JOIN keeps the accounts with 0 persons
         query = f"""
         SELECT 
-            account_id,
-            COUNT(*) as person_count
-        FROM person_norm
-        WHERE account_id IN ({ids_str})
-        GROUP BY account_id
+            sample_ids.id as account_id,
+            COUNT(person_norm.id) as cnt
+        FROM {self.SAMPLE_TABLE} sample_ids
+        LEFT JOIN person_norm ON person_norm.account_id = sample_ids.id
+        GROUP BY sample_ids.id
         """
-        
-        result = self.execute_query(query)
-        
-        # build statistics for each account
-        account_person_map = {row['account_id']: row['person_count'] for row in result}
-        
-        # accounts with 0 persons
-        person_counts = []
-        for aid in account_ids:
-            count = account_person_map.get(aid, 0)
-            person_counts.append(count)
+        summary, bucket_counts = self._count_statistics(query, None, self.ACCOUNT_PERSON_RANGES)
+        if summary is None:
+            print("  ✗ account person analysis failed")
+            return None
         
         # calculate aggregated statistics
         stats = {
             'sample_size': len(account_ids),
-            'accounts_with_persons': len([c for c in person_counts if c > 0]),
-            'accounts_without_persons': len([c for c in person_counts if c == 0]),
-            'total_persons': sum(person_counts),
-            'avg_persons_per_account': round(sum(person_counts) / len(person_counts), 2) if person_counts else 0,
-            'min_persons_per_account': min(person_counts) if person_counts else 0,
-            'max_persons_per_account': max(person_counts) if person_counts else 0,
-            'std_persons_per_account': round(self._calculate_std(person_counts), 2) if person_counts else 0
+            'accounts_with_persons': summary['non_zero'],
+            'accounts_without_persons': summary['zero'],
+            'total_persons': summary['total'],
+            'avg_persons_per_account': summary['avg'],
+            'min_persons_per_account': summary['min'],
+            'max_persons_per_account': summary['max'],
+            'std_persons_per_account': summary['std']
         }
         
         # bucket statistics
-        buckets = self._create_buckets(
-            person_counts,
-            [(0, 0), (1, 5), (6, 10), (11, 20), (21, 50), (51, 100), (101, 500), (501, float('inf'))],
-            ['0', '1-5', '6-10', '11-20', '21-50', '51-100', '101-500', '500+']
-        )
+        buckets = self._create_buckets(bucket_counts, self.ACCOUNT_PERSON_LABELS)
         stats['person_count_buckets'] = buckets
         
         print(f"  ✓ average {stats['avg_persons_per_account']} persons per account")
@@ -170,55 +384,32 @@ class SampleAccountAnalyzer:
         
         return stats
     
-    def analyze_account_activity_counts(self, account_ids: List[int]) -> Dict:
+    def analyze_account_activity_counts(self, account_ids: List[int], rows: Optional[List[Dict]]) -> Optional[Dict]:
         """
-        analyze the number of activities in specified accounts
+        analyze the number of activities in specified accounts, from the rows of the account activity count statistics query
         """
         print(f"\nanalyze {len(account_ids)} accounts' activity relationship (last {self.activity_time_range_days} days, {self.activity_sample_rate*100:.1f}% sample)...")
         
-        ids_str = ','.join(str(id) for id in account_ids)
-        
-        query = f"""
-        SELECT 
-            account_id,
-            COUNT(*) * {1.0/self.activity_sample_rate} as activity_count
-        FROM activity
-        WHERE account_id IN ({ids_str})
-          AND activity_date >= DATE_SUB(NOW(), INTERVAL {self.activity_time_range_days} DAY)
-          AND RAND() < {self.activity_sample_rate}
-        GROUP BY account_id
-        """
-        
-        result = self.execute_query(query)
-        
-        # build statistics for each account (convert Decimal to int)
-        account_activity_map = {row['account_id']: int(row['activity_count']) for row in result}
-        
-        # accounts with 0 activities
-        activity_counts = []
-        for aid in account_ids:
-            count = account_activity_map.get(aid, 0)
-            activity_counts.append(count)
+        summary, bucket_counts = self._read_count_statistics(rows, self.ACCOUNT_ACTIVITY_RANGES)
+        if summary is None:
+            print("  ✗ account activity analysis failed")
+            return None
         
         # calculate aggregated statistics
         stats = {
             'sample_size': len(account_ids),
-            'accounts_with_activities': len([c for c in activity_counts if c > 0]),
-            'accounts_without_activities': len([c for c in activity_counts if c == 0]),
-            'total_activities': sum(activity_counts),
-            'avg_activities_per_account': round(sum(activity_counts) / len(activity_counts), 2) if activity_counts else 0,
-            'min_activities_per_account': min(activity_counts) if activity_counts else 0,
-            'max_activities_per_account': max(activity_counts) if activity_counts else 0,
-            'std_activities_per_account': round(self._calculate_std(activity_counts), 2) if activity_counts else 0,
+            'accounts_with_activities': summary['non_zero'],
+            'accounts_without_activities': summary['zero'],
+            'total_activities': summary['total'],
+            'avg_activities_per_account': summary['avg'],
+            'min_activities_per_account': summary['min'],
+            'max_activities_per_account': summary['max'],
+            'std_activities_per_account': summary['std'],
             'time_range_days': self.activity_time_range_days
         }
         
         # bucket statistics
-        buckets = self._create_buckets(
-            activity_counts,
-            [(0, 0), (1, 10), (11, 50), (51, 100), (101, 500), (501, 1000), (1001, 5000), (5001, float('inf'))],
-            ['0', '1-10', '11-50', '51-100', '101-500', '501-1000', '1001-5000', '5000+']
-        )
+        buckets = self._create_buckets(bucket_counts, self.ACCOUNT_ACTIVITY_LABELS)
         stats['activity_count_buckets'] = buckets
         
         print(f"  ✓ average {stats['avg_activities_per_account']} activities per account")
@@ -226,109 +417,60 @@ class SampleAccountAnalyzer:
         
         return stats
     
-    def analyze_person_activity_counts(self, account_ids: List[int]) -> Dict:
+    def analyze_person_activity_counts(self, account_ids: List[int], rows: Optional[List[Dict]]) -> Optional[Dict]:
         """
-        analyze the number of activities in specified accounts
+        analyze the number of activities in specified accounts, from the rows of the person activity count statistics query
         """
         print(f"\nanalyze {len(account_ids)} accounts' person activity relationship (last {self.activity_time_range_days} days, {self.activity_sample_rate*100:.1f}% sample)...")
         
-        ids_str = ','.join(str(id) for id in account_ids)
+        summary, bucket_counts = self._read_count_statistics(rows, self.PERSON_ACTIVITY_RANGES)
+        if summary is None:
+            print("  ✗ person activity analysis failed")
+            return None
         
-        # get all person_ids in the specified accounts
-        person_query = f"""
-        SELECT id as person_id
-        FROM person_norm
-        WHERE account_id IN ({ids_str})
-        """
-        person_result = self.execute_query(person_query)
-        person_ids = [row['person_id'] for row in person_result]
-        
-        if not person_ids:
+        if not summary['n']:
             print("  ⚠️  no persons in the sample accounts")
             return {}
         
-        print(f"  ✓ found {len(person_ids)} persons")
-        
-        # query the number of activities for these persons (with sampling)
-        person_ids_str = ','.join(str(id) for id in person_ids)
-        
-        query = f"""
-        SELECT 
-            person_id,
-            COUNT(*) * {1.0/self.activity_sample_rate} as activity_count
-        FROM activity
-        WHERE person_id IN ({person_ids_str})
-          AND activity_date >= DATE_SUB(NOW(), INTERVAL {self.activity_time_range_days} DAY)
-          AND RAND() < {self.activity_sample_rate}
-        GROUP BY person_id
-        """
-        
-        result = self.execute_query(query)
-        
-        person_activity_map = {row['person_id']: int(row['activity_count']) for row in result}
-        
-        activity_counts = []
-        for pid in person_ids:
-            count = person_activity_map.get(pid, 0)
-            activity_counts.append(count)
+        print(f"  ✓ found {summary['n']} persons")
         
         # calculate aggregated statistics
         stats = {
-            'sample_persons': len(person_ids),
-            'persons_with_activities': len([c for c in activity_counts if c > 0]),
-            'persons_without_activities': len([c for c in activity_counts if c == 0]),
-            'total_activities': sum(activity_counts),
-            'avg_activities_per_person': round(sum(activity_counts) / len(activity_counts), 2) if activity_counts else 0,
-            'min_activities_per_person': min(activity_counts) if activity_counts else 0,
-            'max_activities_per_person': max(activity_counts) if activity_counts else 0,
-            'std_activities_per_person': round(self._calculate_std(activity_counts), 2) if activity_counts else 0,
+            'sample_persons': summary['n'],
+            'persons_with_activities': summary['non_zero'],
+            'persons_without_activities': summary['zero'],
+            'total_activities': summary['total'],
+            'avg_activities_per_person': summary['avg'],
+            'min_activities_per_person': summary['min'],
+            'max_activities_per_person': summary['max'],
+            'std_activities_per_person': summary['std'],
             'time_range_days': self.activity_time_range_days
         }
         
         # bucket statistics
-        buckets = self._create_buckets(
-            activity_counts,
-            [(0, 0), (1, 10), (11, 50), (51, 100), (101, 500), (501, 1000), (1001, float('inf'))],
-            ['0', '1-10', '11-50', '51-100', '101-500', '501-1000', '1000+']
-        )
+        buckets = self._create_buckets(bucket_counts, self.PERSON_ACTIVITY_LABELS)
         stats['activity_count_buckets'] = buckets
         
         print(f"  ✓ average {stats['avg_activities_per_person']} activities per person")
         
         return stats
     
-    def analyze_activity_types(self, account_ids: List[int]) -> Dict:
+    def analyze_activity_types(self, account_ids: List[int], result: Optional[List[Dict]]) -> Optional[Dict]:
         """
-        analyze the distribution of activity types in specified accounts
+        analyze the distribution of activity types in specified accounts, from the rows of the activity type query
         """
         print(f"\nanalyze {len(account_ids)} accounts' activity type distribution ({self.activity_sample_rate*100:.1f}% sample)...")
         
-        ids_str = ','.join(str(id) for id in account_ids)
-        
-        query = f"""
-        SELECT 
-            activityType,
-            COUNT(*) as count
-        FROM activity
-        WHERE account_id IN ({ids_str})
-          AND activity_date >= DATE_SUB(NOW(), INTERVAL {self.activity_time_range_days} DAY)
-          AND activityType IS NOT NULL
-          AND RAND() < {self.activity_sample_rate}
-        GROUP BY activityType
-        ORDER BY count DESC
-        LIMIT 20
-        """
-        
-        result = self.execute_query(query)
-        
-        # 计算百分比
-        total_count = sum(row['count'] for row in result)
+        if result is None:
+            print("  ✗ activity type analysis failed")
+            return None
         
+        # the percentage is of all sampled activities, computed by the window over every type before the LIMIT
         activity_types = [
             {
                 'type_category': 'type_' + str(i),  # do not expose actual type names
                 'count': row['count'],
-                'percentage': round(row['count'] * 100.0 / total_count, 2) if total_count > 0 else 0
+                'percentage': row['percentage']
             }
             for i, row in enumerate(result)
         ]
@@ -340,42 +482,35 @@ class SampleAccountAnalyzer:
             'total_types': len(activity_types)
         }
     
-    def analyze_list_membership(self, account_ids: List[int]) -> Dict:
+    def analyze_list_membership(self, account_ids: List[int]) -> Optional[Dict]:
         """
         analyze the list membership relationship in specified accounts
         """
         print(f"\nanalyze {len(account_ids)} accounts' list membership relationship...")
         
-        ids_str = ','.join(str(id) for id in account_ids)
-        
+        # list memberships per sample account, the LEFT JOIN keeps the accounts not in any list
         query = f"""
         SELECT 
-            account_id,
-            COUNT(*) as list_count
-        FROM account_list_member
-        WHERE account_id IN ({ids_str})
-        GROUP BY account_id
+            sample_ids.id as account_id,
+            COUNT(account_list_member.account_id) as cnt
+        FROM {self.SAMPLE_TABLE} sample_ids
+        LEFT JOIN account_list_member ON account_list_member.account_id = sample_ids.id
+        GROUP BY sample_ids.id
         """
-        
-        result = self.execute_query(query)
-        
-        # build statistics for each account
-        account_list_map = {row['account_id']: row['list_count'] for row in result}
-        
-        list_counts = []
-        for aid in account_ids:
-            count = account_list_map.get(aid, 0)
-            list_counts.append(count)
+        summary, _ = self._count_statistics(query)
+        if summary is None:
+            print("  ✗ list membership analysis failed")
+            return None
         
         stats = {
             'sample_size': len(account_ids),
-            'accounts_in_lists': len([c for c in list_counts if c > 0]),
-            'accounts_not_in_lists': len([c for c in list_counts if c == 0]),
-            'total_memberships': sum(list_counts),
-            'avg_lists_per_account': round(sum(list_counts) / len(list_counts), 2) if list_counts else 0,
-            'min_lists_per_account': min(list_counts) if list_counts else 0,
-            'max_lists_per_account': max(list_counts) if list_counts else 0,
-            'std_lists_per_account': round(self._calculate_std(list_counts), 2) if list_counts else 0
+            'accounts_in_lists': summary['non_zero'],
+            'accounts_not_in_lists': summary['zero'],
+            'total_memberships': summary['total'],
+            'avg_lists_per_account': summary['avg'],
+            'min_lists_per_account': summary['min'],
+            'max_lists_per_account': summary['max'],
+            'std_lists_per_account': summary['std']
         }
         
         print(f"  ✓ average {stats['avg_lists_per_account']} lists per account")
@@ -383,45 +518,128 @@ class SampleAccountAnalyzer:
         
         return stats
     
-    def _calculate_std(self, values: List[float]) -> float:
-        """calculate standard deviation"""
-        if not values or len(values) < 2:
-            return 0.0
-        
-        values = [float(v) for v in values]
-        
-        mean = sum(values) / len(values)
-        variance = sum((x - mean) ** 2 for x in values) / len(values)
-        return variance ** 0.5
+    def _count_statistics(self, per_key_query: str, params: tuple = None, ranges: List[tuple] = None) -> Tuple[Optional[Dict], List[int]]:
+        """
+        bucket the per key counts of a query and compute their statistics on the server in one ROLLUP query
+        :param per_key_query: query returning one row per key with its count as cnt
+        :param ranges: contiguous integer range list [(min, max), ...] in ascending order, starting at 0
+        :return: statistics (n, non_zero, zero, total, avg, min, max, std) and the number of keys per range, None statistics when the query failed
+        """
+        rows = self.execute_query(self._count_statistics_query(per_key_query, ranges), params)
+        return self._read_count_statistics(rows, ranges)
+    
+    def _count_statistics_query(self, per_key_query: str, ranges: List[tuple] = None) -> str:
+        """ROLLUP query bucketing the per key counts (cnt) of a query, one row per bucket and a NULL bucket row over all keys"""
+        ranges = ranges or [(0, float('inf'))]
+        cases = ' '.join(f"WHEN cnt <= {int(max_val)} THEN {i}" for i, (_, max_val) in enumerate(ranges[:-1]))
+        bucket = f"CASE {cases} ELSE {len(ranges) - 1} END" if cases else "0"
+        return f"""
+        SELECT 
+            bucket,
+            COUNT(*) as n,
+            SUM(CASE WHEN cnt > 0 THEN 1 ELSE 0 END) as non_zero,
+            SUM(cnt) as total,
+            AVG(cnt) as avg_cnt,
+            MIN(cnt) as min_cnt,
+            MAX(cnt) as max_cnt,
+            STDDEV_POP(cnt) as std_cnt
+        FROM (
+            SELECT {bucket} as bucket, cnt
+            FROM ({per_key_query}) per_key
+        ) bucketed
+        GROUP BY bucket WITH ROLLUP
+        """
     
-    def _create_buckets(self, values: List[int], ranges: List[tuple], labels: List[str]) -> List[Dict]:
+    def _read_count_statistics(self, rows: Optional[List[Dict]], ranges: List[tuple] = None) -> Tuple[Optional[Dict], List[int]]:
+        """statistics and bucket counts from the rows of a _count_statistics_query, None statistics when the query failed (rows is None)"""
+        ranges = ranges or [(0, float('inf'))]
+        if rows is None:
+            return None, [0] * len(ranges)
+        # the bucket rows are the histogram, the ROLLUP row (NULL bucket) holds the statistics over all keys
+        bucket_counts = [0] * len(ranges)
+        totals = None
+        for row in rows:
+            if row['bucket'] is None:
+                totals = row
+            else:
+                bucket_counts[int(row['bucket'])] = int(row['n'])
+        # no keys: MySQL returns no rows at all, SQL standard ROLLUP (Doris / StarRocks) a total row with NULL aggregates
+        if not totals or not totals['n']:
+            return {'n': 0, 'non_zero': 0, 'zero': 0, 'total': 0, 'avg': 0, 'min': 0, 'max': 0, 'std': 0}, bucket_counts
+        
+        summary = {
+            'n': int(totals['n']),
+            'non_zero': int(totals['non_zero']),
+            'zero': int(totals['n']) - int(totals['non_zero']),
+            'total': int(totals['total']),
+            'avg': round(float(totals['avg_cnt']), 2),
+            'min': int(totals['min_cnt']),
+            'max': int(totals['max_cnt']),
+            'std': round(float(totals['std_cnt']), 2)
+        }
+        return summary, bucket_counts
+    
+    def _create_buckets(self, bucket_counts: List[int], labels: List[str]) -> List[Dict]:
         """
         create bucket statistics
-        :param values: value list
-        :param ranges: range list [(min, max), ...]
+        :param bucket_counts: count list per bucket
         :param labels: label list
         """
-        buckets = {label: 0 for label in labels}
-        
-        for value in values:
-            for (min_val, max_val), label in zip(ranges, labels):
-                if min_val <= value <= max_val:
-                    buckets[label] += 1
-                    break
-        
-        total = len(values)
+        total = sum(bucket_counts)
         return [
             {
                 'range': label,
                 'count': count,
                 'percentage': round(count * 100.0 / total, 2) if total > 0 else 0
             }
-            for label, count in [(l, buckets[l]) for l in labels]
+            for label, count in zip(labels, bucket_counts)
         ]
     
+    def _cache_path(self) -> str:
+        """results cache file of the current config"""
+        key_config = {field: self.config.get(field) for field in self.CACHE_KEY_FIELDS}
+        # the analyses do not depend on the order or repetition of the specified account ids
+        key_config['account_ids'] = sorted(set(key_config['account_ids'] or []))
+        key = hashlib.sha1(json.dumps(key_config, sort_keys=True).encode('utf-8')).hexdigest()
+        return os.path.join(self.cache_dir, f"{self.config.get('database', 'unknown')}-{key}.json")
+    
+    def load_cached_results(self) -> bool:
+        """load the results of a previous run with the same config if it is younger than the cache ttl"""
+        if self.cache_ttl_seconds <= 0:
+            return False
+        cache_path = self._cache_path()
+        try:
+            age = time.time() - os.path.getmtime(cache_path)
+            if age > self.cache_ttl_seconds:
+                return False
+            with open(cache_path, 'r', encoding='utf-8') as f:
+                self.results = json.load(f)
+        except (OSError, ValueError):
+            return False
+        print(f"✓ use cached results: {cache_path} ({int(age)}s old)")
+        return True
+    
+    def save_cached_results(self):
+        """write the results to the cache, through a temporary file so a concurrent run never reads a partial one"""
+        if self.cache_ttl_seconds <= 0:
+            return
+        cache_path = self._cache_path()
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            with open(cache_path + '.tmp', 'wb') as f:
+                f.write(_dumps(self.results))
+            os.replace(cache_path + '.tmp', cache_path)
+        except OSError as e:
+            print(f"⚠️  write results cache failed: {e}")
+    
     def run(self, output_file: str = 'sample_account_analysis.json'):
         """execute sample analysis"""
         try:
+            if self.load_cached_results():
+                self.save_results(output_file)
+                self.print_summary()
+                return
+            
             self.connect()
             
             print(f"\nconfiguration:")
@@ -432,30 +650,38 @@ class SampleAccountAnalyzer:
             # step 1: get sample account IDs
             account_ids = self.get_sample_account_ids()
             self.results['metadata']['actual_sample_size'] = len(account_ids)
-            self.results['metadata']['account_ids_sample'] = account_ids
-            
-            # step 2: analyze account-person relationship
-            person_stats = self.analyze_account_person_counts(account_ids)
-            self.results['aggregated_stats']['account_person'] = person_stats
-            
-            # step 3: analyze account-activity relationship
-            activity_stats = self.analyze_account_activity_counts(account_ids)
-            self.results['aggregated_stats']['account_activity'] = activity_stats
-            
-            # step 4: analyze person-activity relationship
-            person_activity_stats = self.analyze_person_activity_counts(account_ids)
-            self.results['aggregated_stats']['person_activity'] = person_activity_stats
-            
-            # step 5: analyze list membership relationship
-            list_stats = self.analyze_list_membership(account_ids)
-            self.results['aggregated_stats']['account_list'] = list_stats
+            if len(account_ids) > self.MAX_LISTED_ACCOUNT_IDS:
+                edge = self.LISTED_ACCOUNT_IDS_EDGE
+                self.results['metadata']['account_ids_sample'] = account_ids[:edge] + ['...'] + account_ids[-edge:]
+            else:
+                self.results['metadata']['account_ids_sample'] = account_ids
+            self.create_sample_table(account_ids)
             
-            # step 6: analyze activity type distribution
-            type_stats = self.analyze_activity_types(account_ids)
-            self.results['aggregated_stats']['activity_types'] = type_stats
+            # step 2-6: the relationship analyses only depend on the sample account IDs, run them concurrently,
+            # the three activity analyses share one scan of the activity table
+            with ThreadPoolExecutor(max_workers=self.pool_size) as executor:
+                person_future = executor.submit(self.analyze_account_person_counts, account_ids)
+                activity_future = executor.submit(self.analyze_sampled_activity, account_ids)
+                list_future = executor.submit(self.analyze_list_membership, account_ids)
+                activity_stats = activity_future.result()
+                analyses = {
+                    'account_person': person_future.result(),
+                    'account_activity': activity_stats['account_activity'],
+                    'person_activity': activity_stats['person_activity'],
+                    'account_list': list_future.result(),
+                    'activity_types': activity_stats['activity_types']
+                }
+            # a failed analysis is left out instead of being reported as an empty sample
+            failed = [name for name, stats in analyses.items() if stats is None]
+            self.results['aggregated_stats'].update({name: stats for name, stats in analyses.items() if stats is not None})
+            if failed:
+                self.results['metadata']['failed_analyses'] = failed
+                print(f"\n⚠️  failed analyses: {', '.join(failed)}")
             
-            # save results
+            # save results, incomplete results are not cached
             self.save_results(output_file)
+            if not failed:
+                self.save_cached_results()
             
             # print summary
             self.print_summary()
@@ -469,8 +695,8 @@ class SampleAccountAnalyzer:
     def save_results(self, output_file: str):
         """save analysis results"""
         output_path = os.path.join(os.path.dirname(__file__), output_file)
-        with open(output_path, 'w', encoding='utf-8') as f:
-            json.dump(self.results, f, indent=2, ensure_ascii=False, cls=DecimalEncoder)
+        with open(output_path, 'wb') as f:
+            f.write(_dumps(self.results, pretty=True))
         print(f"\n✓ analysis results saved to: {output_path}")
     
     def print_summary(self):
@@ -495,7 +721,7 @@ class SampleAccountAnalyzer:
             print(f"  - standard deviation: {stats['account_activity']['std_activities_per_account']}")
             print(f"  - activity count range: {stats['account_activity']['min_activities_per_account']} - {stats['account_activity']['max_activities_per_account']}")
         
-        if 'person_activity' in stats:
+        if stats.get('person_activity'):  # empty when the sample accounts have no persons
             print(f"\nperson-activity relationship (last {self.activity_time_range_days} days):")
             print(f"  - sample person size: {stats['person_activity']['sample_persons']}")
             print(f"  - average activities per person: {stats['person_activity']['avg_activities_per_person']}")
@@ -533,10 +759,12 @@ def main():
         'user': os.getenv('DB_USER', 'root'),
         'password': os.getenv('DB_PASSWORD', ''),
         'database': os.getenv('DB_NAME', 'tenant'),
+        'pool_size': int(os.getenv('POOL_SIZE', '5')),  # concurrent queries / connections
         'sample_size': int(os.getenv('SAMPLE_SIZE', '1000')),  # default 1000 accounts
         'activity_time_range_days': int(os.getenv('ACTIVITY_TIME_RANGE_DAYS', '90')),
         'activity_sample_rate': float(os.getenv('ACTIVITY_SAMPLE_RATE', '0.01')),  # default 1% sampling for activity queries
-        'account_ids': account_ids  # optional: specify specific account IDs, leave blank for random sampling
+        'account_ids': account_ids,  # optional: specify specific account IDs, leave blank for random sampling
+        'cache_ttl_seconds': int(os.getenv('CACHE_TTL_SECONDS', '0'))  # reuse results of the same config, 0 disables the cache
     }
     
     print("\nfeatures:")